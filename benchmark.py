@@ -0,0 +1,424 @@
+"""Offline benchmark of the scrape, parse, save, query and plot stages against a stored baseline."""
+
+import argparse
+import calendar
+import http.server
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("main." + __name__)
+
+#Stages whose median latency may grow, or throughput shrink, by this fraction before failing.
+DEFAULT_TOLERANCE = 0.5
+
+def synthetic_page(year:int, month:int, seed:int = 0) -> bytes:
+    """Builds a month page in the climate site's markup, with missing, flagged and blank cells."""
+
+    generator = random.Random(seed * 1000003 + year * 100 + month)
+    name = calendar.month_name[month]
+    rows = []
+
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        high = round(generator.uniform(-30, 35), 1)
+        low = round(high - generator.uniform(0, 15), 1)
+        cells = [f"{high}", f"{low}", f"{round((high + low) / 2, 1)}", "0.0", "0.0"]
+
+        if day % 11 == 5:
+            cells[2] = "M"
+
+        if day % 13 == 7:
+            cells[0] = f'{high}<abbr title="Estimated">E</abbr>'
+
+        if day % 17 == 9:
+            cells[1] = "&nbsp;"
+
+        header = f'<th scope="row"><abbr title="{name} {day}, {year}">{day:02d}</abbr></th>'
+        rows.append(f'<tr>\n{header}\n' + "".join(f"<td>{cell}</td>\n" for cell in cells) + "</tr>")
+
+    rows.append('<tr>\n<th scope="row">Sum</th><td>&nbsp;</td></tr>')
+    rows.append('<tr>\n<th scope="row">Avg</th><td>1.0</td><td>2.0</td><td>3.0</td></tr>')
+    previous = ' class="previous disabled"' if (year, month) <= (1996, 10) else ''
+
+    return (f'<!DOCTYPE html><html><head><title>Daily Data Report for {name} {year}</title></head>'
+            f'<body>\n<ul><li id="prev"{previous}><a href="#">Previous Month</a></li></ul>\n'
+            '<table class="data-table"><caption>Daily Data Report</caption>\n'
+            '<thead><tr><th>DAY</th><th>Max Temp</th><th>Min Temp</th><th>Mean Temp</th></tr>'
+            '</thead>\n<tbody>\n' + "\n".join(rows) + '\n</tbody></table></body></html>'
+            ).encode("utf-8")
+
+def saved_pages(directory:str) -> dict:
+    """Loads every page of a PageCache directory as {(year, month): page}."""
+
+    from page_cache import PageCache
+
+    cache = PageCache(directory)
+    pages = {}
+
+    for key in list(cache.entries):
+        station, year, month = key.split("/")
+        hit = cache.get(int(station), int(year), int(month))
+
+        if hit is not None:
+            pages[(int(year), int(month))] = hit[0]
+
+    return pages
+
+class PageServer(http.server.ThreadingHTTPServer):
+    """Local HTTP stand-in answering daily data requests with prepared pages."""
+
+    daemon_threads = True
+
+    def __init__(self, pages:dict):
+        """Intializes an instance of the PageServer class on a free loopback port."""
+
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.pages = pages
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """The base url to hand to WeatherScraper."""
+
+        return f"http://127.0.0.1:{self.server_address[1]}/climate_data/daily_data_e.html"
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+
+        self.shutdown()
+        self.server_close()
+
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the page for the Year and Month query parameters over keep-alive connections."""
+
+    protocol_version = "HTTP/1.1"
+
+    #Buffered writes send headers and body together,
+    #unbuffered ones stall keep-alive on delayed ACKs.
+    wbufsize = 65536
+
+    def do_GET(self):
+        """Answers one page request."""
+
+        query = parse_qs(urlparse(self.path).query)
+        page = self.server.pages.get((int(query["Year"][0]), int(query["Month"][0])))
+
+        if page is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        """Keeps request logging off the benchmark's output."""
+
+def percentile(ordered:list, fraction:float) -> float:
+    """Returns the nearest-rank percentile of an ascending list."""
+
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))]
+
+def summarize(latencies:list, units:int, unit:str, elapsed:float = None) -> dict:
+    """Summarizes per-call latencies and the units of work they covered."""
+
+    ordered = sorted(latencies)
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+
+    return {"calls": len(ordered), "units": units, "unit": unit, "seconds": elapsed,
+            "throughput": units / elapsed if elapsed else 0.0,
+            "p50": percentile(ordered, 0.5), "p90": percentile(ordered, 0.9),
+            "p99": percentile(ordered, 0.99), "max": ordered[-1]}
+
+def timed(function, *args) -> tuple:
+    """Calls a function and returns (seconds, result)."""
+
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def bench_scrape(pages:dict, workers:int) -> tuple:
+    """Downloads every page from the stand-in through HTTPSession, returns (stats, pages)."""
+
+    from http_session import HTTPSession
+    from scrape_weather import WeatherScraper
+
+    server = PageServer(pages)
+
+    try:
+        session = HTTPSession(pool_size=workers)
+        scraper = WeatherScraper(base_url=server.url, session=session)
+        months = sorted(pages)
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda month: timed(scraper.fetch_month, *month), months))
+
+        elapsed = time.perf_counter() - start
+        session.close()
+        fetched = {month: page for month, (_, page) in zip(months, results)}
+
+        return summarize([seconds for seconds, _ in results], sum(map(len, fetched.values())),
+                         "bytes", elapsed), fetched
+
+    finally:
+        server.stop()
+
+def bench_parse(pages:dict) -> tuple:
+    """Parses each page with the extractor and the reference parser, returns (stats, mismatches)."""
+
+    from scrape_weather import WeatherScraper, extract_daily_table
+
+    scraper = WeatherScraper()
+    extract, reference, mismatches = [], [], []
+    rows = 0
+
+    for month, page in sorted(pages.items()):
+        seconds, (weather, _) = timed(extract_daily_table, page)
+        extract.append(seconds)
+        rows += len(weather)
+
+        seconds, expected = timed(scraper.reference_parse, page)
+        reference.append(seconds)
+
+        #The fast extractor has to agree with the HTMLParser it replaced on every page.
+        if weather != expected:
+            mismatches.append(f"{month[0]:04d}-{month[1]:02d}")
+
+    return {"parse": summarize(extract, rows, "rows"),
+            "parse_reference": summarize(reference, rows, "rows")}, mismatches
+
+def synthetic_year(year:int, generator:random.Random) -> dict:
+    """Generates a year of daily readings in the scraper's {date: {Max, Min, Mean}} form."""
+
+    data = {}
+
+    for month in range(1, 13):
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            high = round(generator.uniform(-30, 35), 1)
+            low = round(high - generator.uniform(0, 15), 1)
+            mean = "M" if generator.random() < 0.01 else str(round((high + low) / 2, 1))
+            data[f"{year:04d}-{month:02d}-{day:02d}"] = {"Max": str(high), "Min": str(low),
+                                                          "Mean": mean}
+
+    return data
+
+def bench_save(dbname:str, stations:int, years:list, seed:int) -> dict:
+    """Builds a multi-station database one save_data call per station year."""
+
+    from db_operations import DBOperations
+
+    generator = random.Random(seed)
+    latencies = []
+    rows = 0
+    DBOperations(dbname).intialize_db()
+
+    for number in range(stations):
+        dbops = DBOperations(dbname, f"Station {number}")
+
+        for year in years:
+            data = synthetic_year(year, generator)
+            seconds, _ = timed(dbops.save_data, data)
+            latencies.append(seconds)
+            rows += len(data)
+
+    return summarize(latencies, rows, "rows")
+
+def bench_query(dbname:str, stations:int, years:list, repeat:int, seed:int) -> dict:
+    """Times year range, month and series queries against random stations and ranges."""
+
+    from db_operations import DBOperations
+
+    generator = random.Random(seed)
+    latencies = {"fetch_data_year": [], "fetch_data_month": [], "fetch_series": []}
+    rows = dict.fromkeys(latencies, 0)
+
+    for _ in range(repeat):
+        dbops = DBOperations(dbname, f"Station {generator.randrange(stations)}", cached=False)
+        start = generator.choice(years)
+        end = min(start + generator.randrange(1, 11), years[-1])
+        month = generator.randrange(1, 13)
+
+        calls = (("fetch_data_year", lambda: dbops.fetch_data_year(start, end),
+                  lambda result: sum(map(len, result.values()))),
+                 ("fetch_data_month", lambda: dbops.fetch_data_month(month, start), len),
+                 ("fetch_series", lambda: dbops.fetch_series(f"{start}-01-01", f"{end}-12-31"),
+                  len))
+
+        for name, call, count in calls:
+            seconds, result = timed(call)
+            latencies[name].append(seconds)
+            rows[name] += count(result)
+
+    return {name: summarize(latencies[name], rows[name], "rows") for name in latencies}
+
+def bench_plot(dbname:str, years:list, repeat:int) -> dict:
+    """Times uncached off-screen box and line plot rendering."""
+
+    from db_operations import DBOperations
+    from plot_operations import PlotRenderer
+
+    dbops = DBOperations(dbname, "Station 0")
+    renderer = PlotRenderer()
+    stats = dbops.fetch_box_stats(years[0], years[-1])
+    series = dbops.fetch_series(f"{years[0]}-01-01", f"{years[0]}-01-31")
+    box, line = [], []
+
+    #The first render pays for importing matplotlib and loading fonts.
+    renderer.render_series('line', 1, years[0], series)
+
+    for _ in range(repeat):
+        box.append(timed(renderer.render_box_plot_from_stats, years[0], years[-1], stats)[0])
+        line.append(timed(renderer.render_series, 'line', 1, years[0], series)[0])
+
+    return {"plot_box": summarize(box, len(box), "images"),
+            "plot_line": summarize(line, len(line), "images")}
+
+def run(args) -> dict:
+    """Runs every stage and returns the report."""
+
+    if args.pages:
+        pages = saved_pages(args.pages)
+
+    else:
+        pages = {(year, month): synthetic_page(year, month, args.seed)
+                 for year in range(args.first_year, args.first_year + args.page_years)
+                 for month in range(1, 13)}
+
+    years = list(range(args.first_year, args.first_year + args.years))
+    config = {"pages": len(pages), "stations": args.stations, "years": args.years,
+              "repeat": args.repeat, "seed": args.seed, "synthetic_pages": not args.pages}
+    report = {"config": config, "stages": {}, "parity_failures": []}
+
+    report["stages"]["scrape"], fetched = bench_scrape(pages, args.workers)
+    parse_stats, report["parity_failures"] = bench_parse(fetched)
+    report["stages"].update(parse_stats)
+
+    with tempfile.TemporaryDirectory() as directory:
+        dbname = os.path.join(directory, "benchmark.sqlite")
+        report["stages"]["save"] = bench_save(dbname, args.stations, years, args.seed)
+        report["stages"].update(bench_query(dbname, args.stations, years, args.repeat, args.seed))
+        report["stages"].update(bench_plot(dbname, years, max(1, args.repeat // 5)))
+
+        #Pooled connections hold the file open until they are closed.
+        from connection_pool import ConnectionPool
+        ConnectionPool.for_database(dbname).close()
+
+    return report
+
+def compare(report:dict, baseline:dict, tolerance:float) -> list:
+    """Lists the stages whose median latency or throughput regressed past the tolerance."""
+
+    regressions = []
+
+    for stage, expected in baseline.get("stages", {}).items():
+        measured = report["stages"].get(stage)
+
+        if measured is None:
+            continue
+
+        if measured["p50"] > expected["p50"] * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {measured['p50'] * 1000:.2f} ms "
+                               f"vs {expected['p50'] * 1000:.2f} ms")
+
+        if measured["throughput"] < expected["throughput"] * (1 - tolerance):
+            regressions.append(f"{stage}: {measured['throughput']:.0f} "
+                               f"vs {expected['throughput']:.0f} {measured['unit']}/s")
+
+    return regressions
+
+def print_report(report:dict):
+    """Prints one line per stage."""
+
+    print(f"{'stage':<18}{'calls':>7}{'throughput':>16}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+
+    for stage, stats in report["stages"].items():
+        percentiles = "".join(f"{stats[key] * 1000:>10.2f}" for key in ("p50", "p90", "p99"))
+        print(f"{stage:<18}{stats['calls']:>7}{stats['throughput']:>11.0f} {stats['unit'][:4]:<4}"
+              + percentiles)
+
+def main(argv:list = None) -> int:
+    """Runs the benchmark, returns 1 on a regression or missing baseline, 2 on a parse mismatch."""
+
+    parser = argparse.ArgumentParser(prog="benchmark", description=__doc__)
+    parser.add_argument("--pages",
+                        help="PageCache directory of saved pages, synthetic pages otherwise.")
+    parser.add_argument("--page-years", type=int, default=10,
+                        help="Years of synthetic month pages.")
+    parser.add_argument("--stations", type=int, default=3,
+                        help="Stations in the synthetic database.")
+    parser.add_argument("--years", type=int, default=30,
+                        help="Years of data per synthetic station.")
+    parser.add_argument("--first-year", type=int, default=1990)
+    parser.add_argument("--repeat", type=int, default=50, help="Queries per query stage.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default="benchmark_baseline.json",
+                        help="Baseline report to compare with.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline.")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="Only report, without a baseline to compare with.")
+    parser.add_argument("--output", help="Also write the full JSON report here.")
+    args = parser.parse_args(argv)
+
+    #A missing baseline would otherwise let every slowdown pass unnoticed.
+    if not (args.update_baseline or args.no_baseline or os.path.exists(args.baseline)):
+        print(f"no baseline at {args.baseline}, run with --update-baseline to create one "
+              "or --no-baseline to only report", file=sys.stderr)
+        return 1
+
+    report = run(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if report["parity_failures"]:
+        print(f"extractor and reference parser disagree on: {', '.join(report['parity_failures'])}",
+              file=sys.stderr)
+        return 2
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+        return 0
+
+    if args.no_baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+
+    #Numbers from a different workload say nothing about a regression.
+    if baseline.get("config") != report["config"]:
+        print(f"baseline {args.baseline} was recorded with {baseline.get('config')}, "
+              f"not {report['config']}", file=sys.stderr)
+        return 1
+
+    regressions = compare(report, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
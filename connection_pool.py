@@ -0,0 +1,92 @@
+"""This Module pools tuned SQLite connections and times statements when instrumentation is on."""
+
+import logging
+import queue
+import sqlite3
+import threading
+import instrumentation
+
+class ConnectionPool():
+    """Process-wide pool of tuned SQLite connections for one database file."""
+
+    logger = logging.getLogger("main." + __name__)
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, dbname:str, size:int = 8, cache_kib:int = 16384, mmap_bytes:int = 268435456):
+        """Intializes an instance of the ConnectionPool class."""
+
+        try:
+            self.dbname = dbname
+            self.size = size
+            self.cache_kib = cache_kib
+            self.mmap_bytes = mmap_bytes
+            self.idle = queue.LifoQueue()
+
+        except Exception as error:
+            self.logger.error("ConnectionPool:init:%s", error)
+
+    @classmethod
+    def for_database(cls, dbname:str):
+        """Returns the shared pool for a database file, creating it on first use."""
+
+        with cls.pools_lock:
+            if dbname not in cls.pools:
+                cls.pools[dbname] = cls(dbname)
+
+            return cls.pools[dbname]
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a connection configured once for WAL and concurrent readers."""
+
+        #Connections move between threads but are only ever used by one at a time.
+        connection = sqlite3.connect(self.dbname, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL;")
+        connection.execute("PRAGMA synchronous = NORMAL;")
+        connection.execute(f"PRAGMA cache_size = -{self.cache_kib};")
+        connection.execute(f"PRAGMA mmap_size = {self.mmap_bytes};")
+        connection.execute("PRAGMA temp_store = MEMORY;")
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        """Takes an idle connection or opens a new one."""
+
+        try:
+            return self.idle.get_nowait()
+
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, connection:sqlite3.Connection):
+        """Returns a connection to the pool, closing it if the pool is full."""
+
+        if self.idle.qsize() < self.size:
+            self.idle.put(connection)
+
+        else:
+            connection.close()
+
+    def close(self):
+        """Closes every idle connection."""
+
+        try:
+            while not self.idle.empty():
+                self.idle.get_nowait().close()
+
+        except Exception as error:
+            self.logger.error("ConnectionPool:close:%s", error)
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times every statement into a per-statement span."""
+
+    def execute(self, sql:str, parameters=()):
+        """Runs a statement, timing it up to its first row."""
+
+        with instrumentation.span("sql", {"statement": instrumentation.statement_label(sql)}):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql:str, seq_of_parameters):
+        """Runs a statement once per parameter set, timing the whole batch."""
+
+        with instrumentation.span("sql", {"statement": instrumentation.statement_label(sql)}):
+            return super().executemany(sql, seq_of_parameters)
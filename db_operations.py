@@ -1,20 +1,131 @@
-"""This Module stores and manages the database collection for the weather.sqlite DB."""
+"""This Module stores and manages the weather database collection, weather.sqlite by default."""
 
+import calendar
+import functools
 import logging
+import os
+import re
 import sqlite3
-from dateutil import parser
+import threading
+from collections import deque
+from concurrent.futures import Future
+from datetime import date
 from pubsub import pub
+import instrumentation
+from connection_pool import ConnectionPool, TracedCursor
+from db_writer import DBWriter
+from progress import ProgressReporter
+from query_cache import QUERY_CACHE, cached_query
+from stations import DEFAULT_STATION
+
+#Data-quality flags stored in weather.quality for values missing on the source page.
+MISSING_MAX = 1
+MISSING_MIN = 2
+MISSING_MEAN = 4
+MISSING_ALL = MISSING_MAX | MISSING_MIN | MISSING_MEAN
+
+#Each entry upgrades the schema by one PRAGMA user_version, never edit a shipped migration.
+MIGRATIONS = (
+    ("""create table if not exists weather
+        (id integer primary key autoincrement not null,
+        sample_date text,
+        location text,
+        min_temp real,
+        max_temp real,
+        avg_temp real);""",),
+
+    ("""create table if not exists scrape_checkpoint
+        (location text not null,
+        year integer not null,
+        month integer not null,
+        primary key (location, year, month));""",),
+
+    #Rebuilds the table with NULL for missing values, a quality flag and a unique index.
+    ("""create table weather_typed
+        (id integer primary key autoincrement not null,
+        sample_date text not null,
+        location text not null,
+        min_temp real,
+        max_temp real,
+        avg_temp real,
+        quality integer not null default 0);""",
+     """INSERT INTO weather_typed (id, sample_date, location, min_temp, max_temp, avg_temp, quality)
+        SELECT id, date(sample_date), location,
+            CASE WHEN typeof(min_temp) IN ('real', 'integer') THEN min_temp END,
+            CASE WHEN typeof(max_temp) IN ('real', 'integer') THEN max_temp END,
+            CASE WHEN typeof(avg_temp) IN ('real', 'integer') THEN avg_temp END,
+            (typeof(max_temp) NOT IN ('real', 'integer')) * 1
+            + (typeof(min_temp) NOT IN ('real', 'integer')) * 2
+            + (typeof(avg_temp) NOT IN ('real', 'integer')) * 4
+        FROM weather
+        WHERE id IN (SELECT max(id) FROM weather GROUP BY date(sample_date), location);""",
+     """DROP TABLE weather;""",
+     """ALTER TABLE weather_typed RENAME TO weather;""",
+     """create unique index weather_location_date on weather (location, sample_date);"""),
+
+    ("""create table if not exists weather_monthly
+        (location text not null,
+        year integer not null,
+        month integer not null,
+        count integer not null,
+        min_temp real,
+        max_temp real,
+        mean_temp real,
+        sum_squares real,
+        q1_temp real,
+        median_temp real,
+        q3_temp real,
+        primary key (location, year, month));""",
+     """DELETE FROM weather_monthly;""",
+     "SUMMARY"),
+
+    ("""create table if not exists scrape_log
+        (location text not null,
+        year integer not null,
+        month integer not null,
+        fetched_on text not null,
+        primary key (location, year, month));""",),
+
+    ("""create table if not exists data_versions
+        (location text primary key not null,
+        version integer not null);""",
+     """INSERT OR IGNORE INTO data_versions (location, version)
+        SELECT DISTINCT location, 1 FROM weather;"""),
+
+    #Rows each logged page held, older log entries count as empty pages and get fetched again.
+    ("""ALTER TABLE scrape_log ADD COLUMN days integer not null default 0;""",),
+)
+
+#Summarizes daily mean temperatures per station and month, quartiles are nearest-rank.
+SUMMARY_SQL = """INSERT INTO weather_monthly
+    (location, year, month, count, min_temp, max_temp, mean_temp, sum_squares,
+    q1_temp, median_temp, q3_temp)
+    WITH ranked AS (SELECT location, substr(sample_date, 1, 7) AS period, avg_temp,
+                        cume_dist() OVER (PARTITION BY location, substr(sample_date, 1, 7)
+                                        ORDER BY avg_temp) AS rank
+                    FROM weather
+                    WHERE avg_temp IS NOT NULL {where})
+    SELECT location, CAST(substr(period, 1, 4) AS INTEGER), CAST(substr(period, 6, 2) AS INTEGER),
+        count(*), min(avg_temp), max(avg_temp), avg(avg_temp), sum(avg_temp * avg_temp),
+        min(CASE WHEN rank >= 0.25 THEN avg_temp END),
+        min(CASE WHEN rank >= 0.5 THEN avg_temp END),
+        min(CASE WHEN rank >= 0.75 THEN avg_temp END)
+    FROM ranked
+    GROUP BY location, period;"""
+
+NUMBER = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
 
 class DBCM():
     """Context manager."""
 
     logger = logging.getLogger("main." + __name__)
 
-    def __init__(self, dbname:str):
+    def __init__(self, dbname:str, pooled:bool = False):
         """Intializes an instance of the DBCM class."""
 
         try:
             self.dbname = dbname
+            self.pool = ConnectionPool.for_database(dbname) if pooled else None
             self.connection = None
             self.cursor = None
 
@@ -25,20 +136,37 @@ class DBCM():
         """Connects to and opens the DB for changes."""
 
         try:
-            self.connection = sqlite3.connect(self.dbname)
-            self.cursor = self.connection.cursor()
+            if self.pool:
+                self.connection = self.pool.acquire()
+
+            else:
+                self.connection = sqlite3.connect(self.dbname)
+
+            #Statements are only timed while instrumentation is on, plain cursors cost nothing.
+            cursor_class = TracedCursor if instrumentation.enabled else sqlite3.Cursor
+            self.cursor = self.connection.cursor(cursor_class)
             return self.cursor
 
         except Exception as error:
             self.logger.error("DBCM:enter:%s", error)
 
     def __exit__(self, exc_type, exc_value, exc_trace):
-        """Closes the connection."""
+        """Commits, or rolls back if the block raised, and releases the connection."""
 
         try:
-            self.connection.commit()
+            if exc_type is None:
+                self.connection.commit()
+
+            else:
+                self.connection.rollback()
+
             self.cursor.close()
-            self.connection.close()
+
+            if self.pool:
+                self.pool.release(self.connection)
+
+            else:
+                self.connection.close()
 
         except Exception as error:
             self.logger.error("DBCM:exit:%s", error)
@@ -48,63 +176,146 @@ class DBOperations():
 
     logger = logging.getLogger("main." + __name__)
 
-    def __init__(self):
-        """Intializes the DBOperations class."""
-        self.insert_counter = 0
+    def __init__(self, dbname:str = "weather.sqlite", location:str = DEFAULT_STATION.name,
+                 pooled:bool = True, snapshot:str = None, cached:bool = True,
+                 writer:DBWriter = None):
+        """Intializes the DBOperations class for one database file and station."""
+        self.dbname = dbname
+        self.location = location
+        self.pooled = pooled
+        self.snapshot = snapshot
+        self.cached = cached
+        self.writer = writer
+
+    def connect(self) -> DBCM:
+        """Returns a context manager for the database, pooled unless disabled."""
+
+        return DBCM(self.dbname, self.pooled)
+
+    def run_write(self, work):
+        """Runs work(cursor) in one transaction, on the writer thread when one is configured."""
+
+        if self.writer is not None:
+            return self.writer.submit(work).result()
+
+        with self.connect() as conn:
+            return work(conn)
 
     def intialize_db(self):
-        """Intializes the database."""
+        """Creates the database or upgrades it in place to the newest schema version."""
 
         try:
-            with DBCM("weather.sqlite") as conn:
-                conn.execute("""create table if not exists weather
-                            (id integer primary key autoincrement not null,
-                            sample_date text,
-                            location text,
-                            min_temp real,
-                            max_temp real,
-                            avg_temp real);""")
+            with self.connect() as conn:
+                version = conn.execute("PRAGMA user_version;").fetchone()[0]
+
+                for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                    conn.execute("BEGIN;")
+
+                    for sql in statements:
+                        conn.execute(SUMMARY_SQL.format(where="") if sql == "SUMMARY" else sql)
+
+                    conn.execute(f"PRAGMA user_version = {number};")
+                    conn.connection.commit()
 
         except Exception as error:
             self.logger.error("DBOps:init:%s", error)
 
-    def fetch_data_year(self, start_year:str, end_year:str) -> dict:
+    def to_row(self, sample_date:str, value:dict) -> tuple:
+        """Converts scraped values into a (date, max, min, mean, location, quality) row."""
+
+        return self.record_to_row((sample_date, value.get('Max', ''), value.get('Min', ''),
+                                   value.get('Mean', '')))
+
+    def record_to_row(self, record:tuple) -> tuple:
+        """Converts a scraped (date, max, min, mean) record into a weather row."""
+
+        row = [record[0]]
+        quality = 0
+
+        for text, flag in zip(record[1:4], (MISSING_MAX, MISSING_MIN, MISSING_MEAN)):
+            match = NUMBER.match(str(text))
+
+            if match:
+                row.append(float(match.group(1)))
+
+            else:
+                row.append(None)
+                quality |= flag
+
+        return tuple(row) + (self.location, quality)
+
+    def to_rows(self, data) -> list:
+        """Builds weather rows from a {date: values} dict or a list of scraped records."""
+
+        if isinstance(data, dict):
+            return [self.to_row(key, value) for key, value in data.items()]
+
+        return [self.record_to_row(record) for record in data]
+
+    def fetch_data_year(self, start_year:str, end_year:str, as_numpy:bool = False) -> dict:
         """Fetches the average temperatures between and including the given year range."""
 
+        return self.fetch_range(f'{int(start_year):04d}-01-01', f'{int(end_year):04d}-12-31',
+                                as_numpy)
+
+    @cached_query
+    def fetch_range(self, start_date:str, end_date:str, as_numpy:bool = False) -> dict:
+        """Fetches the average temperatures between two ISO dates grouped by month in one query."""
+
         try:
+            sql = ("""SELECT CAST(substr(sample_date, 6, 2) AS INTEGER), avg_temp
+                        FROM weather
+                        WHERE location = ?
+                        AND sample_date BETWEEN ? AND ?
+                        AND avg_temp IS NOT NULL
+                        ORDER BY sample_date;""")
+
+            with self.connect() as conn:
+                rows = conn.execute(sql, (self.location, start_date, end_date)).fetchall()
+
+            if as_numpy:
+                import numpy
+
+                table = numpy.array(rows, dtype=float).reshape(-1, 2)
+                months = table[:, 0].astype(int)
+
+                return {month: table[months == month, 1] for month in range(1, 13)}
+
             monthly_data = {1:[], 2:[], 3:[], 4:[], 5:[],
                             6:[], 7:[], 8:[], 9:[], 10:[], 11:[], 12:[]}
 
-            date = parser.parse(f'{start_year}-01-01')
-
-            while date.year <= int(end_year):
+            for month, temp in rows:
+                monthly_data[month].append(temp)
 
-                try:
-                    sql = ("""SELECT sample_date, avg_temp
-                            FROM weather
-                            WHERE date(sample_date) LIKE ?||'%'
-                            ORDER BY sample_date;""")
+            return monthly_data
 
-                    value = (date.year,)
+        except Exception as error:
+            self.logger.error("DBOps:fetch_range:%s", error)
 
-                    with DBCM("weather.sqlite") as conn:
-                        for row in conn.execute(sql, value):
-                            month = parser.parse(row[0]).month
+    @cached_query
+    def fetch_series(self, start_date:str = "0001-01-01", end_date:str = "9999-12-31"):
+        """Loads the station's daily rows between two ISO dates into a columnar WeatherSeries."""
 
-                            #Removes 'M' characters from data.
-                            if type(row[1]) != str:
-                                monthly_data[month].append(row[1])
+        try:
+            from weather_series import WeatherSeries
 
-                    date = date.replace(year=date.year + 1)
+            #julianday minus 1721424.5 is the proleptic Gregorian ordinal used by date.toordinal.
+            sql = ("""SELECT CAST(julianday(sample_date) - 1721424.5 AS INTEGER),
+                            max_temp, min_temp, avg_temp
+                        FROM weather
+                        WHERE location = ?
+                        AND sample_date BETWEEN ? AND ?
+                        ORDER BY sample_date;""")
 
-                except Exception as error:
-                    self.logger.error("DBOps:fetch_year loop 1:%s", error)
+            with self.connect() as conn:
+                rows = conn.execute(sql, (self.location, start_date, end_date)).fetchall()
 
-            return monthly_data
+            return WeatherSeries.from_rows(rows, self.location)
 
         except Exception as error:
-            self.logger.error("DBOps:fetch_year:%s", error)
+            self.logger.error("DBOps:fetch_series:%s", error)
 
+    @cached_query
     def fetch_data_month(self, month:str, year:str) -> dict:
         """Fetches the average temperatures for the given month of the given year."""
 
@@ -113,12 +324,14 @@ class DBOperations():
 
             sql = ("""SELECT sample_date, avg_temp
                         FROM weather
-                        WHERE date(sample_date) LIKE ?||'-'||?||'%'
+                        WHERE location = ?
+                        AND sample_date BETWEEN ? AND ?
                         ORDER BY sample_date;""")
 
-            value = (year, month)
+            prefix = f'{int(year):04d}-{int(month):02d}'
+            value = (self.location, prefix + '-01', prefix + '-31')
 
-            with DBCM("weather.sqlite") as conn:
+            with self.connect() as conn:
                 for row in conn.execute(sql, value):
                     temps[row[0]] = row[1]
 
@@ -127,51 +340,301 @@ class DBOperations():
 
         return temps
 
-    def save_data(self, data:dict):
-        """Saves distinct data to the database."""
+    def save_data(self, data:dict, batch_size:int = 1000):
+        """Upserts the data into the database, one transaction per batch of rows."""
 
         try:
-            dates = self.get_db_dates()
+            rows = self.to_rows(data)
+            progress = ProgressReporter('save', len(rows))
+
+            if self.writer is not None:
+                batches = [rows[start:start + batch_size]
+                           for start in range(0, len(rows), batch_size)]
+                futures = [self.writer.submit(functools.partial(self.upsert_rows, rows=batch))
+                           for batch in batches]
 
-            #Only inserts data if the date isnt already in the database.
-            for key, value in data.items():
-                try:
-                    if key not in dates:
+                for batch, future in zip(batches, futures):
+                    try:
+                        future.result()
+                        progress.advance(len(batch), rows=len(batch))
 
-                        sql = ("""insert into weather
-                            (sample_date, max_temp, min_temp, avg_temp, location)
-                            values(?, ?, ?, ?, ?);""")
+                    except Exception as error:
+                        self.logger.error("DBOps:save loop 1:%s", error)
 
-                        data[key]['location'] = 'Winnipeg, MB'
-                        value = (key, value['Max'], value['Min'], value['Mean'], value['location'])
+            else:
+                self.save_rows(rows, batch_size, progress)
+
+            progress.finish()
+            self.refresh_snapshot()
+            pub.sendMessage('complete')
 
-                        with DBCM("weather.sqlite") as conn:
-                            conn.execute(sql, value)
+        except Exception as error:
+            self.logger.error("DBOps:save:%s", error)
 
-                    else:
-                        sql = ("""UPDATE weather
-                                SET max_temp = ?,
-                                    min_temp = ?,
-                                    avg_temp = ?,
-                                    location = ?
-                                WHERE sample_date = ?;""")
+    def save_rows(self, rows:list, batch_size:int, progress:ProgressReporter):
+        """Upserts rows on a pooled connection, committing each batch."""
 
-                        data[key]['location'] = 'Winnipeg, MB'
-                        value = (value['Max'], value['Min'], value['Mean'], value['location'], key)
+        try:
+            with self.connect() as conn:
+                for start in range(0, len(rows), batch_size):
+                    try:
+                        batch = rows[start:start + batch_size]
+                        self.upsert_rows(conn, batch)
+                        conn.connection.commit()
+                        progress.advance(len(batch), rows=len(batch))
+
+                    except Exception as error:
+                        conn.connection.rollback()
+                        self.logger.error("DBOps:save loop 1:%s", error)
 
-                        with DBCM("weather.sqlite") as conn:
-                            conn.execute(sql, value)
-                    
-                    self.insert_counter += 1
-                    pub.sendMessage('load', counter=self.insert_counter)
+        except Exception as error:
+            self.logger.error("DBOps:save_rows:%s", error)
+
+    def upsert_rows(self, conn, rows:list):
+        """Inserts rows built by to_row, updating the ones whose date already exists."""
+
+        sql = ("""INSERT INTO weather
+                    (sample_date, max_temp, min_temp, avg_temp, location, quality)
+                    VALUES(?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(location, sample_date) DO UPDATE
+                    SET max_temp = excluded.max_temp,
+                        min_temp = excluded.min_temp,
+                        avg_temp = excluded.avg_temp,
+                        quality = excluded.quality;""")
+
+        conn.executemany(sql, rows)
+        instrumentation.count("rows_written", len(rows))
+        self.update_monthly(conn, {(row[4], row[0][:7]) for row in rows})
+
+        #Every write bumps the station's data version so caches keyed on it go stale.
+        conn.executemany("""INSERT INTO data_versions (location, version) VALUES(?, 1)
+                            ON CONFLICT(location) DO UPDATE SET version = version + 1;""",
+                         [(location,) for location in {row[4] for row in rows}])
+
+    def update_monthly(self, conn, periods:set):
+        """Recomputes the weather_monthly summaries of the given (location, 'YYYY-MM') periods."""
+
+        conn.executemany("""DELETE FROM weather_monthly
+                            WHERE location = ? AND year = ? AND month = ?;""",
+                         [(location, int(period[:4]), int(period[5:7]))
+                          for location, period in periods])
+
+        conn.executemany(SUMMARY_SQL.format(where="AND location = ? "
+                                                  "AND sample_date BETWEEN ? AND ?"),
+                         [(location, period + '-01', period + '-31')
+                          for location, period in periods])
+
+    def save_batches(self, batches, chunk_months:int = 12, cancel:threading.Event = None,
+                     max_pending:int = 4) -> int:
+        """Saves streamed (year, month, data or records) batches, committing per chunk of months."""
 
-                except Exception as error:
-                    self.logger.error("DBOps:save loop 1:%s", error)
+        try:
+            saved = 0
+            chunk = []
+            pending = deque()
+            finished = False
 
+            try:
+                for batch in batches:
+                    chunk.append(batch)
+
+                    if len(chunk) >= chunk_months:
+                        pending.append(self.submit_chunk(chunk))
+                        chunk = []
+
+                    #Keeps scraping while a few chunks wait for the writer thread.
+                    while len(pending) > max_pending:
+                        saved += pending.popleft().result()
+
+                    if cancel is not None and cancel.is_set():
+                        break
+
+                finished = cancel is None or not cancel.is_set()
+
+            #Months parsed before a failed stream are still committed and checkpointed.
+            finally:
+                if chunk:
+                    pending.append(self.submit_chunk(chunk))
+
+                while pending:
+                    saved += pending.popleft().result()
+
+            #Only a stream that ran to its end clears the checkpoints, a cancelled or failed one
+            #keeps them to resume from.
+            if finished:
+                self.run_write(lambda conn: conn.execute("""DELETE FROM scrape_checkpoint
+                                                            WHERE location = ?;""",
+                                                         (self.location,)))
+
+            self.refresh_snapshot()
             pub.sendMessage('complete')
+            return saved
 
         except Exception as error:
-            self.logger.error("DBOps:save:%s", error)
+            self.logger.error("DBOps:save_batches:%s", error)
+
+    def submit_chunk(self, chunk:list) -> Future:
+        """Queues a chunk on the writer thread, or writes it straight away without one."""
+
+        if self.writer is not None:
+            return self.writer.submit(functools.partial(self.apply_chunk, chunk=chunk))
+
+        future = Future()
+        future.set_result(self.write_chunk(chunk))
+        return future
+
+    def write_chunk(self, chunk:list) -> int:
+        """Writes a chunk of month batches and their checkpoints in one transaction."""
+
+        return self.run_write(functools.partial(self.apply_chunk, chunk=chunk))
+
+    def apply_chunk(self, conn, chunk:list) -> int:
+        """Upserts a chunk of month batches and records their checkpoints on an open transaction."""
+
+        rows = 0
+
+        for year, month, data in chunk:
+            month_rows = self.to_rows(data)
+            self.upsert_rows(conn, month_rows)
+            rows += len(data)
+
+            #Blank rows for days that have not happened yet do not count as logged days.
+            days = sum(row[-1] != MISSING_ALL for row in month_rows)
+
+            conn.execute("""INSERT OR IGNORE INTO scrape_checkpoint (location, year, month)
+                            VALUES(?, ?, ?);""", (self.location, year, month))
+
+            conn.execute("""INSERT OR REPLACE INTO scrape_log
+                                (location, year, month, fetched_on, days)
+                            VALUES(?, ?, ?, date('now'), ?);""",
+                         (self.location, year, month, days))
+
+        return rows
+
+    def pending_months(self, months:list) -> list:
+        """Filters out months already committed by an interrupted streaming run."""
+
+        try:
+            with self.connect() as conn:
+                done = set(conn.execute("""SELECT year, month
+                                            FROM scrape_checkpoint
+                                            WHERE location = ?;""", (self.location,)))
+
+            return [month for month in months if tuple(month) not in done]
+
+        except Exception as error:
+            self.logger.error("DBOps:pending_months:%s", error)
+            return months
+
+    @cached_query
+    def fetch_monthly_summary(self, start_year:str, end_year:str) -> list:
+        """Fetches the stored monthly summaries between and including the given years."""
+
+        try:
+            sql = ("""SELECT year, month, count, min_temp, max_temp, mean_temp,
+                            sum_squares, q1_temp, median_temp, q3_temp
+                        FROM weather_monthly
+                        WHERE location = ?
+                        AND year BETWEEN ? AND ?
+                        ORDER BY year, month;""")
+
+            keys = ('year', 'month', 'count', 'min', 'max', 'mean',
+                    'sum_squares', 'q1', 'median', 'q3')
+
+            with self.connect() as conn:
+                rows = conn.execute(sql, (self.location, int(start_year), int(end_year)))
+                return [dict(zip(keys, row)) for row in rows]
+
+        except Exception as error:
+            self.logger.error("DBOps:fetch_monthly_summary:%s", error)
+
+    @cached_query
+    def fetch_box_stats(self, start_year:str, end_year:str) -> dict:
+        """Combines monthly summaries into approximate per-month box plot statistics."""
+
+        try:
+            #Quartiles across years are count weighted averages of the monthly quartiles.
+            sql = ("""SELECT month, sum(count), min(min_temp), max(max_temp),
+                            sum(mean_temp * count) / sum(count),
+                            sum(sum_squares) / sum(count),
+                            sum(q1_temp * count) / sum(count),
+                            sum(median_temp * count) / sum(count),
+                            sum(q3_temp * count) / sum(count)
+                        FROM weather_monthly
+                        WHERE location = ?
+                        AND year BETWEEN ? AND ?
+                        GROUP BY month
+                        ORDER BY month;""")
+
+            stats = {}
+
+            with self.connect() as conn:
+                for row in conn.execute(sql, (self.location, int(start_year), int(end_year))):
+                    month, count, low, high, mean, mean_square, q1, median, q3 = row
+
+                    #Keys follow matplotlib's Axes.bxp statistics format.
+                    stats[month] = {'label': str(month), 'count': count, 'mean': mean,
+                                    'std': max(mean_square - mean * mean, 0) ** 0.5,
+                                    'whislo': low, 'q1': q1, 'med': median, 'q3': q3,
+                                    'whishi': high}
+
+            return stats
+
+        except Exception as error:
+            self.logger.error("DBOps:fetch_box_stats:%s", error)
+
+    def plan_update(self, first_month:date, today:date = None, recheck_months:int = 2) -> list:
+        """Lists the (year, month) pages that are missing, partial or still have missing values."""
+
+        try:
+            today = today or date.today()
+            sql = ("""SELECT substr(sample_date, 1, 7), sum(quality != ?), sum(quality != 0)
+                        FROM weather
+                        WHERE location = ?
+                        GROUP BY substr(sample_date, 1, 7);""")
+
+            with self.connect() as conn:
+                stored = {period: (days, missing)
+                          for period, days, missing
+                          in conn.execute(sql, (MISSING_ALL, self.location))}
+                logged_pages = conn.execute("""SELECT year, month, fetched_on, days
+                                                FROM scrape_log
+                                                WHERE location = ?;""", (self.location,))
+                fetched = {(year, month): (fetched_on, logged)
+                           for year, month, fetched_on, logged in logged_pages}
+
+            months = []
+            year, month = today.year, today.month
+
+            while (year, month) >= (first_month.year, first_month.month):
+                days, missing = stored.get(f'{year:04d}-{month:02d}', (0, 0))
+
+                if (year, month) == (today.year, today.month):
+                    expected = today.day
+
+                else:
+                    expected = calendar.monthrange(year, month)[1]
+
+                #Days count only rows with a value, blank rows are gaps. A page fetched after its
+                #month closed is final, gaps in it are gaps at the source, as long as it had rows
+                #and they are all still stored.
+                age = (today.year - year) * 12 + today.month - month
+                fetched_on, logged = fetched.get((year, month), ('', 0))
+                final = fetched_on > f'{year:04d}-{month:02d}-{expected:02d}' and 0 < logged <= days
+
+                if (age < recheck_months or not final) and (days < expected or missing):
+                    months.append((year, month))
+
+                if month == 1:
+                    year, month = year - 1, 12
+
+                else:
+                    month -= 1
+
+            return months
+
+        except Exception as error:
+            self.logger.error("DBOps:plan_update:%s", error)
 
     def purge_data(self):
         """Deletes all data from the DB."""
@@ -179,12 +642,170 @@ class DBOperations():
         try:
             sql = """DROP TABLE weather;"""
 
-            with DBCM("weather.sqlite") as conn:
+            #Resets the schema version so intialize_db recreates the tables, the scrape log and
+            #checkpoints go too so the next update fetches every month again.
+            with self.connect() as conn:
                 conn.execute(sql)
+                conn.execute("DROP TABLE IF EXISTS weather_monthly;")
+                conn.execute("DROP TABLE IF EXISTS scrape_log;")
+                conn.execute("DELETE FROM scrape_checkpoint;")
+                conn.execute("UPDATE data_versions SET version = version + 1;")
+                conn.execute("PRAGMA user_version = 0;")
 
         except Exception as error:
             self.logger.error("DBOps:purge:%s", error)
 
+    def cache_stats(self) -> dict:
+        """Returns the shared query cache's hit and miss statistics."""
+
+        return QUERY_CACHE.stats()
+
+    def get_data_version(self) -> int:
+        """Returns the station's data version, which changes whenever its rows are written."""
+
+        try:
+            with self.connect() as conn:
+                row = conn.execute("SELECT version FROM data_versions WHERE location = ?;",
+                                   (self.location,)).fetchone()
+
+            return row[0] if row else 0
+
+        except Exception as error:
+            self.logger.error("DBOps:get_data_version:%s", error)
+
+    def export_snapshot(self, path:str) -> list:
+        """Writes every station to a binary snapshot, re-reading only stations that changed."""
+
+        try:
+            from snapshot import Snapshot, densify, write_snapshot
+
+            with self.connect() as conn:
+                versions = conn.execute("""SELECT location, version
+                                            FROM data_versions
+                                            ORDER BY location;""").fetchall()
+
+            previous = Snapshot(path) if os.path.exists(path) else None
+            blocks = {}
+            rebuilt = []
+
+            for location, version in versions:
+                if previous is not None and previous.version(location) == version:
+                    blocks[location] = previous.block(location)
+                    continue
+
+                dbops = DBOperations(self.dbname, location, self.pooled, cached=False)
+                series = dbops.fetch_series()
+
+                if series is not None and len(series):
+                    blocks[location] = (version,) + densify(series)
+                    rebuilt.append(location)
+
+            #Unchanged stations are copied from the old mapping, no rows are read for them.
+            write_snapshot(path, blocks)
+
+            if previous is not None:
+                blocks.clear()
+                previous.close()
+
+            return rebuilt
+
+        except Exception as error:
+            self.logger.error("DBOps:export_snapshot:%s", error)
+
+    def open_snapshot(self, path:str = None):
+        """Memory-maps a snapshot for read-only, zero-copy station and date-range slices."""
+
+        try:
+            from snapshot import Snapshot
+
+            return Snapshot(path or self.snapshot)
+
+        except Exception as error:
+            self.logger.error("DBOps:open_snapshot:%s", error)
+
+    def import_snapshot(self, path:str, batch_size:int = 1000) -> int:
+        """Upserts every day with data from a snapshot into the database, returns rows written."""
+
+        try:
+            import numpy
+            from snapshot import Snapshot
+            from weather_series import EPOCH_ORDINAL
+
+            written = 0
+
+            with Snapshot(path) as snapshot, self.connect() as conn:
+                for location in snapshot.stations:
+                    _, ordinals, values, present = snapshot.block(location)
+                    missing = numpy.isnan(values)
+                    quality = (missing[0] * MISSING_MAX + missing[1] * MISSING_MIN
+                               + missing[2] * MISSING_MEAN)
+                    dates = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]').astype(str)
+
+                    #Shortest float32 reprs round trip the stored tenths,
+                    #REAL affinity converts them back.
+                    text = values.astype(str).astype(object)
+                    text[missing] = None
+
+                    days = numpy.flatnonzero(present)
+
+                    for start in range(0, len(days), batch_size):
+                        index = days[start:start + batch_size]
+                        rows = zip(dates[index].tolist(), text[0, index].tolist(),
+                                   text[1, index].tolist(), text[2, index].tolist(),
+                                   [location] * len(index), quality[index].tolist())
+                        self.upsert_rows(conn, list(rows))
+                        conn.connection.commit()
+                        written += len(index)
+
+            return written
+
+        except Exception as error:
+            self.logger.error("DBOps:import_snapshot:%s", error)
+
+    def refresh_snapshot(self):
+        """Regenerates the configured snapshot after a save, if one is configured."""
+
+        if self.snapshot:
+            self.export_snapshot(self.snapshot)
+
+    def iter_rows(self, start_date:str, end_date:str, chunk_size:int = 1000):
+        """Yields (sample_date, max, min, mean, quality) rows between two ISO dates in chunks."""
+
+        try:
+            sql = ("""SELECT sample_date, max_temp, min_temp, avg_temp, quality
+                        FROM weather
+                        WHERE location = ?
+                        AND sample_date BETWEEN ? AND ?
+                        ORDER BY sample_date;""")
+
+            with self.connect() as conn:
+                cursor = conn.execute(sql, (self.location, start_date, end_date))
+                rows = cursor.fetchmany(chunk_size)
+
+                while rows:
+                    yield from rows
+                    rows = cursor.fetchmany(chunk_size)
+
+        except Exception as error:
+            self.logger.error("DBOps:iter_rows:%s", error)
+
+    @cached_query
+    def get_years(self) -> list:
+        """Returns the station's years that have data, read from the monthly summary index."""
+
+        try:
+            sql = """SELECT DISTINCT year
+                        FROM weather_monthly
+                        WHERE location = ?
+                        ORDER BY year;"""
+
+            with self.connect() as conn:
+                return [str(row[0]) for row in conn.execute(sql, (self.location,))]
+
+        except Exception as error:
+            self.logger.error("DBOps:get_years:%s", error)
+            return []
+
     def get_db_dates(self) -> list:
         """Grabs all the dates from the database."""
 
@@ -192,10 +813,11 @@ class DBOperations():
             dates = []
             sql = ("""SELECT sample_date
                         FROM weather
+                        WHERE location = ?
                         ORDER BY sample_date;""")
 
-            with DBCM("weather.sqlite") as conn:
-                for row in conn.execute(sql):
+            with self.connect() as conn:
+                for row in conn.execute(sql, (self.location,)):
                     dates.append(row[0])
 
             return dates
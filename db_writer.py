@@ -0,0 +1,177 @@
+"""This Module runs one writer thread that commits queued database work in grouped transactions."""
+
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+import instrumentation
+from connection_pool import ConnectionPool, TracedCursor
+
+class DBWriter():
+    """Single thread that owns a database's write connection and commits queued work in batches."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, dbname:str = "weather.sqlite", max_items:int = 64, queue_size:int = 256):
+        """Intializes an instance of the DBWriter class and starts its thread."""
+
+        try:
+            self.dbname = dbname
+            self.max_items = max_items
+            self.queue = queue.Queue(queue_size)
+            self.transactions = 0
+            self.items = 0
+            self.error = None
+            self.stopped = False
+            self.finished = threading.Event()
+            self.thread = threading.Thread(target=self.run, name=f"DBWriter {dbname}", daemon=True)
+            self.thread.start()
+
+        except Exception as error:
+            self.logger.error("DBWriter:init:%s", error)
+
+    def __enter__(self) -> 'DBWriter':
+        """Returns the running writer."""
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_trace):
+        """Commits the queued work and stops the thread."""
+
+        self.stop()
+
+    def submit(self, work) -> Future:
+        """Queues work(cursor), the future resolves to its result once its transaction commits."""
+
+        if self.stopped:
+            raise RuntimeError(f"DBWriter for {self.dbname} is stopped")
+
+        future = Future()
+
+        #A full queue blocks the producer, which is the writer's backpressure.
+        self.queue.put((work, future))
+
+        #Work that raced past stop() fails here instead of waiting on a thread that has exited.
+        if self.finished.is_set():
+            self.fail_queued()
+
+        return future
+
+    def stop(self):
+        """Finishes the queued work and stops the thread, later submits raise."""
+
+        try:
+            self.stopped = True
+
+            if self.thread.is_alive():
+                self.queue.put(None)
+                self.thread.join()
+
+        except Exception as error:
+            self.logger.error("DBWriter:stop:%s", error)
+
+    def run(self):
+        """Drains the queue, committing everything waiting at once as one transaction."""
+
+        try:
+            connection = ConnectionPool.for_database(self.dbname).connect()
+
+        except Exception as error:
+            self.logger.error("DBWriter:run:%s", error)
+            self.error = error
+            self.stopped = True
+            self.finished.set()
+            self.fail_queued()
+            return
+
+        try:
+            stopping = False
+
+            while not stopping:
+                group = [self.queue.get()]
+
+                while len(group) < self.max_items:
+                    try:
+                        group.append(self.queue.get_nowait())
+
+                    except queue.Empty:
+                        break
+
+                stopping = None in group
+                self.commit_group(connection, [item for item in group if item is not None])
+
+        finally:
+            connection.close()
+            self.stopped = True
+            self.finished.set()
+            self.fail_queued()
+
+    def fail_queued(self):
+        """Fails the futures of work still queued after the thread has exited."""
+
+        error = self.error or RuntimeError(f"DBWriter for {self.dbname} is stopped")
+
+        while True:
+            try:
+                item = self.queue.get_nowait()
+
+            except queue.Empty:
+                return
+
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(error)
+
+    def commit_group(self, connection:sqlite3.Connection, group:list):
+        """Runs each item under a savepoint of one transaction, settling futures after commit."""
+
+        outcomes = []
+
+        try:
+            cursor = connection.cursor(TracedCursor if instrumentation.enabled else sqlite3.Cursor)
+
+            with instrumentation.span("db_writer_transaction", items=len(group)):
+                cursor.execute("BEGIN;")
+
+                for work, future in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    #A failing item rolls back alone, the rest of the group still commits.
+                    cursor.execute("SAVEPOINT item;")
+
+                    try:
+                        outcomes.append((future, work(cursor), None))
+                        cursor.execute("RELEASE item;")
+
+                    except Exception as error:
+                        cursor.execute("ROLLBACK TO item;")
+                        cursor.execute("RELEASE item;")
+                        outcomes.append((future, None, error))
+
+                connection.commit()
+
+            cursor.close()
+            self.transactions += 1
+            self.items += len(outcomes)
+
+        except Exception as error:
+            self.logger.error("DBWriter:commit_group:%s", error)
+            connection.rollback()
+
+            #Items after the failing point never started, they fail too instead of staying pending.
+            for _, future in group:
+                if future.done():
+                    continue
+
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+
+            return
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+
+            else:
+                future.set_exception(error)
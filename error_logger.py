@@ -1,17 +1,181 @@
 """Error Logging Module."""
+import atexit
+import json
 import logging
 import logging.handlers
+import os
+import queue
+import threading
+import time
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record:logging.LogRecord) -> str:
+        """Returns the record as a JSON line."""
+
+        entry = {"time": self.formatTime(record),
+                 "logger": record.name,
+                 "level": record.levelname,
+                 "message": record.getMessage(),
+                 "thread": record.threadName}
+
+        #QueueHandler.prepare has already folded any traceback into the message.
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+
+        return json.dumps(entry)
+
+class TextFormatter(logging.Formatter):
+    """The original text format, noting how many repeats were suppressed before a record."""
+
+    def format(self, record:logging.LogRecord) -> str:
+        """Returns the record as a text line."""
+
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+
+        return f"{text} ({suppressed} identical suppressed)" if suppressed else text
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most burst identical records per window, counting the rest."""
+
+    def __init__(self, window:float = 60.0, burst:int = 5, max_keys:int = 4096):
+        """Intializes an instance of the RateLimitFilter class."""
+
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.seen = {}
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        """Returns False for a record over its message's limit."""
+
+        #Call sites share one template for every error, so the formatted message tells floods apart.
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+
+        with self.lock:
+            if key not in self.seen and len(self.seen) >= self.max_keys:
+                self.prune(now)
+
+            started, emitted, suppressed = self.seen.get(key, (now, 0, 0))
+
+            if now - started >= self.window:
+                started, emitted = now, 0
+
+            if emitted >= self.burst:
+                self.seen[key] = (started, emitted, suppressed + 1)
+                return False
+
+            self.seen[key] = (started, emitted + 1, 0)
+
+        record.suppressed = suppressed
+        return True
+
+    def prune(self, now:float):
+        """Forgets messages whose window has passed with nothing suppressed."""
+
+        for key, (started, _, suppressed) in list(self.seen.items()):
+            if now - started >= self.window and not suppressed:
+                del self.seen[key]
+
+    def flush(self) -> list:
+        """Returns and forgets the (logger, level, message, count) of records still suppressed."""
+
+        with self.lock:
+            pending = [key + (suppressed,)
+                       for key, (_, _, suppressed) in self.seen.items() if suppressed]
+            self.seen.clear()
+
+        return pending
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the writer falls behind."""
+
+    def __init__(self, log_queue:queue.Queue):
+        """Intializes an instance of the DroppingQueueHandler class."""
+
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record:logging.LogRecord):
+        """Queues a record without waiting."""
+
+        try:
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped += 1
+
+listener = None
+handler = None
+
+def configure(level:str = "ERROR", path:str = "error.log", json_format:bool = False,
+              max_bytes:int = 10485760, backup_count:int = 10, window:float = 60.0,
+              burst:int = 5, queue_size:int = 10000):
+    """Routes the main logger through a queue to a background thread writing the rotating log."""
+
+    global listener, handler
 
-try:
     logger = logging.getLogger("main")
-    logger.setLevel(logging.ERROR)
-    fh = logging.handlers.RotatingFileHandler(filename="error.log",
-                                                maxBytes=10485760,
-                                                backupCount=10)
-    fh.setLevel(logging.ERROR)
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+
+    if listener is not None:
+        shutdown()
+        logger.removeHandler(handler)
+
+    fh = logging.handlers.RotatingFileHandler(filename=path,
+                                              maxBytes=max_bytes,
+                                              backupCount=backup_count)
+    fh.setLevel(level)
+
+    if json_format:
+        fh.setFormatter(JSONFormatter())
+
+    else:
+        fh.setFormatter(TextFormatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    #Callers only format and enqueue, file writes and rollovers happen on the listener thread.
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    handler.setLevel(level)
+    handler.addFilter(RateLimitFilter(window, burst))
+
+    logger.setLevel(level)
+    logger.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(handler.queue, fh, respect_handler_level=True)
+    listener.start()
+
+def shutdown():
+    """Writes out every queued record and stops the writer thread."""
+
+    global listener
+
+    if listener is not None:
+        #Reports floods that ended inside their window before the writer stops.
+        for name, level, message, count in handler.filters[0].flush():
+            logging.getLogger(name).log(level, "%s identical records suppressed: %s",
+                                        count, message)
+
+        if handler.dropped:
+            logging.getLogger("main").error("Logger:shutdown %s records dropped, queue full",
+                                            handler.dropped)
+            handler.dropped = 0
+
+        listener.stop()
+
+        for file_handler in listener.handlers:
+            file_handler.close()
+
+        listener = None
+
+try:
+    configure(level=os.environ.get("WEATHER_LOG_LEVEL", "ERROR").upper(),
+              path=os.environ.get("WEATHER_LOG_FILE", "error.log"),
+              json_format=os.environ.get("WEATHER_LOG_JSON", "") not in ("", "0"))
+    atexit.register(shutdown)
 
 except Exception as error:
-    logger.error("Logger:Main %s", error)
\ No newline at end of file
+    logging.getLogger("main").error("Logger:Main %s", error)
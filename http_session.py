@@ -0,0 +1,154 @@
+"""This Module manages pooled keep-alive HTTP connections for the scrapers."""
+
+import gzip
+import http.client
+import logging
+import queue
+import time
+import urllib.error
+import zlib
+from urllib.parse import urlsplit
+import instrumentation
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (http.client.HTTPException, OSError)
+
+class HTTPResponse():
+    """A fully read and decoded HTTP response."""
+
+    def __init__(self, status:int, headers:dict, body:bytes):
+        """Intializes an instance of the HTTPResponse class."""
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+class HTTPSession():
+    """Reusable HTTP session with pooled keep-alive connections, retries and timeouts."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, pool_size:int = 8, timeout:float = 30, retries:int = 3, backoff:float = 0.5):
+        """Intializes an instance of the HTTPSession class."""
+
+        try:
+            self.pool_size = pool_size
+            self.timeout = timeout
+            self.retries = retries
+            self.backoff = backoff
+            self.headers = {"Accept-Encoding": "gzip, deflate",
+                            "Connection": "keep-alive",
+                            "User-Agent": "WeatherProcessor"}
+            self.pools = {}
+
+        except Exception as error:
+            self.logger.error("HTTPSession:init:%s", error)
+
+    def get(self, url:str, headers:dict = None) -> HTTPResponse:
+        """Sends a GET request, retrying transient failures with exponential backoff."""
+
+        parts = urlsplit(url)
+        target = parts.path or "/"
+
+        if parts.query:
+            target += "?" + parts.query
+
+        request_headers = dict(self.headers, **(headers or {}))
+        key = (parts.scheme, parts.hostname, parts.port)
+
+        for attempt in range(self.retries + 1):
+            connection = self.acquire(key)
+
+            try:
+                with instrumentation.span("http_fetch", url=url, attempt=attempt) as timing:
+                    connection.request("GET", target, headers=request_headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                    timing.set(status=response.status, bytes=len(body))
+
+                instrumentation.count("http_bytes", len(body))
+                instrumentation.count("http_responses", labels={"status": response.status})
+                reply_headers = {name.lower(): value for name, value in response.getheaders()}
+
+                if response.will_close:
+                    connection.close()
+
+                else:
+                    self.release(key, connection)
+
+                if response.status in RETRY_STATUSES and attempt < self.retries:
+                    self.logger.error("HTTPSession:get %s:status %s, retrying",
+                                      url, response.status)
+
+                elif response.status >= 400:
+                    raise urllib.error.HTTPError(url, response.status, response.reason,
+                                                 reply_headers, None)
+
+                else:
+                    return HTTPResponse(response.status, reply_headers,
+                                        self.decode(body, reply_headers))
+
+            except urllib.error.HTTPError:
+                raise
+
+            except TRANSIENT_ERRORS as error:
+                connection.close()
+
+                if attempt >= self.retries:
+                    raise
+
+                self.logger.error("HTTPSession:get %s:%s, retrying", url, error)
+
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def acquire(self, key:tuple) -> http.client.HTTPConnection:
+        """Takes an idle connection from the pool or opens a new one."""
+
+        try:
+            return self.pools.setdefault(key, queue.LifoQueue()).get_nowait()
+
+        except queue.Empty:
+            scheme, host, port = key
+
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def release(self, key:tuple, connection:http.client.HTTPConnection):
+        """Returns a connection to the pool, closing it if the pool is full."""
+
+        pool = self.pools.setdefault(key, queue.LifoQueue())
+
+        if pool.qsize() < self.pool_size:
+            pool.put(connection)
+
+        else:
+            connection.close()
+
+    def decode(self, body:bytes, headers:dict) -> bytes:
+        """Decodes a gzip or deflate encoded response body."""
+
+        encoding = headers.get("content-encoding", "").lower()
+
+        if encoding == "gzip":
+            return gzip.decompress(body)
+
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(body)
+
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+
+        return body
+
+    def close(self):
+        """Closes every pooled connection."""
+
+        try:
+            for pool in self.pools.values():
+                while not pool.empty():
+                    pool.get_nowait().close()
+
+        except Exception as error:
+            self.logger.error("HTTPSession:close:%s", error)
@@ -0,0 +1,94 @@
+"""This Module runs the scrape and save pipeline for one or more stations."""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from db_operations import DBOperations
+from db_writer import DBWriter
+from http_session import HTTPSession
+from page_cache import PageCache
+from scrape_weather import WeatherScraper, parse_pool
+from stations import DEFAULT_STATION, Station
+
+logger = logging.getLogger("main." + __name__)
+
+def ingest_station(station:Station = DEFAULT_STATION, dbname:str = "weather.sqlite",
+                   max_workers:int = 8, session:HTTPSession = None, cache:PageCache = None,
+                   parse_workers:int = 0, chunksize:int = 4, writer:DBWriter = None,
+                   pool:ProcessPoolExecutor = None) -> int:
+    """Streams every month of a station into the database, resuming an interrupted run."""
+
+    try:
+        scraper = WeatherScraper(session=session, cache=cache, station=station)
+        dbops = DBOperations(dbname, station.name, writer=writer)
+        months = dbops.pending_months(scraper.month_list())
+
+        #Parsing moves to a process pool when pages mostly come from the cache.
+        if parse_workers:
+            batches = scraper.iter_months_parallel(months, max_workers, parse_workers,
+                                                   chunksize, pool)
+
+        else:
+            batches = scraper.iter_months(months, max_workers)
+
+        return dbops.save_batches(batches)
+
+    except Exception as error:
+        logger.error("ingest:ingest_station %s:%s", station.name, error)
+
+def update_station(station:Station = DEFAULT_STATION, dbname:str = "weather.sqlite",
+                   max_workers:int = 8, session:HTTPSession = None, cache:PageCache = None,
+                   writer:DBWriter = None) -> int:
+    """Fetches only the months the planner finds missing or incomplete for a station."""
+
+    try:
+        scraper = WeatherScraper(session=session, cache=cache, station=station)
+        dbops = DBOperations(dbname, station.name, writer=writer)
+
+        months = dbops.plan_update(station.first_month)
+
+        return dbops.save_batches(scraper.iter_months(months, max_workers))
+
+    except Exception as error:
+        logger.error("ingest:update_station %s:%s", station.name, error)
+
+def ingest_stations(stations:list, dbname:str = "weather.sqlite", max_stations:int = 4,
+                    max_workers:int = 8, cache:PageCache = None, parse_workers:int = 0,
+                    chunksize:int = 4, full:bool = True, single_writer:bool = True) -> dict:
+    """Ingests or updates stations in parallel into one database, returns rows saved per station."""
+
+    try:
+        DBOperations(dbname).intialize_db()
+        session = HTTPSession(pool_size=max_workers * max_stations)
+        futures = {}
+
+        #One writer thread commits every station's chunks, producers never wait on the write lock.
+        writer = DBWriter(dbname) if single_writer else None
+
+        #Stations share one parse pool, so parse_workers bounds the processes of the whole run.
+        pool = parse_pool(parse_workers) if full and parse_workers else None
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_stations)) as executor:
+                for station in stations:
+                    if full:
+                        futures[station.name] = executor.submit(
+                            ingest_station, station, dbname, max_workers, session, cache,
+                            parse_workers, chunksize, writer, pool)
+
+                    else:
+                        futures[station.name] = executor.submit(
+                            update_station, station, dbname, max_workers, session, cache, writer)
+
+        finally:
+            if writer is not None:
+                writer.stop()
+
+            if pool is not None:
+                pool.shutdown()
+
+            session.close()
+
+        return {name: future.result() for name, future in futures.items()}
+
+    except Exception as error:
+        logger.error("ingest:ingest_stations:%s", error)
@@ -0,0 +1,272 @@
+"""This Module records timing spans and counters for the hot paths, doing nothing until enabled."""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("main." + __name__)
+
+#Upper bounds in seconds of the histogram buckets every span is counted into.
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+enabled = False
+trace_file = None
+lock = threading.Lock()
+counters = {}
+histograms = {}
+
+class NullSpan():
+    """Span handed out while instrumentation is disabled, every method is a no-op."""
+
+    def __enter__(self) -> 'NullSpan':
+        """Starts nothing."""
+
+        return self
+
+    def __exit__(self, *exc_info):
+        """Records nothing."""
+
+    def set(self, **attrs):
+        """Ignores the attributes."""
+
+NULL_SPAN = NullSpan()
+
+class Span():
+    """Times a block into its histogram and, when tracing, one JSONL trace record."""
+
+    __slots__ = ("name", "labels", "attrs", "wall", "start")
+
+    def __init__(self, name:str, labels:dict, attrs:dict):
+        """Intializes an instance of the Span class."""
+
+        self.name = name
+        self.labels = labels
+        self.attrs = attrs
+
+    def __enter__(self) -> 'Span':
+        """Starts the clock."""
+
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_trace):
+        """Stops the clock and records the span, noting the exception type if the block raised."""
+
+        duration = time.perf_counter() - self.start
+
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+
+        record(self.name, duration, self.labels, self.attrs, self.wall)
+
+    def set(self, **attrs):
+        """Adds attributes that are only known once the block has run."""
+
+        self.attrs.update(attrs)
+
+def span(name:str, labels:dict = None, **attrs):
+    """Returns a context manager timing the block as the named span, a no-op when disabled."""
+
+    if not enabled:
+        return NULL_SPAN
+
+    return Span(name, labels, attrs)
+
+def count(name:str, value:float = 1, labels:dict = None):
+    """Adds to a counter, does nothing when disabled."""
+
+    if not enabled:
+        return
+
+    key = (name, tuple(sorted(labels.items())) if labels else ())
+
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+def record(name:str, duration:float, labels:dict = None, attrs:dict = None, wall:float = None):
+    """Adds a finished span to its histogram and writes it to the trace."""
+
+    key = (name, tuple(sorted(labels.items())) if labels else ())
+
+    with lock:
+        histogram = histograms.get(key)
+
+        if histogram is None:
+            histogram = histograms[key] = [0, 0.0, [0] * len(BUCKETS)]
+
+        histogram[0] += 1
+        histogram[1] += duration
+
+        for index, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                histogram[2][index] += 1
+                break
+
+        if trace_file is not None:
+            entry = {"name": name, "start": wall, "duration": duration,
+                     "thread": threading.current_thread().name}
+            entry.update(labels or {})
+            entry.update(attrs or {})
+            trace_file.write(json.dumps(entry, default=str) + "\n")
+
+def enable(trace_path:str = None):
+    """Turns recording on, appending every span to a JSONL trace file if one is given."""
+
+    global enabled, trace_file
+
+    try:
+        with lock:
+            if trace_path and trace_file is None:
+                trace_file = open(trace_path, "a", encoding="utf-8")
+
+            enabled = True
+
+    except Exception as error:
+        logger.error("instrumentation:enable:%s", error)
+
+def disable():
+    """Turns recording off and closes the trace file, keeping the collected metrics."""
+
+    global enabled, trace_file
+
+    try:
+        with lock:
+            enabled = False
+
+            if trace_file is not None:
+                trace_file.close()
+                trace_file = None
+
+    except Exception as error:
+        logger.error("instrumentation:disable:%s", error)
+
+def reset():
+    """Forgets every counter and histogram."""
+
+    with lock:
+        counters.clear()
+        histograms.clear()
+
+def escape(value) -> str:
+    """Escapes a Prometheus label value."""
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def label_text(labels:tuple, extra:str = None) -> str:
+    """Formats Prometheus labels."""
+
+    pairs = [f'{key}="{escape(value)}"' for key, value in labels]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def prometheus_text() -> str:
+    """Returns every counter and span histogram in the Prometheus text exposition format."""
+
+    lines = []
+
+    with lock:
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE weather_{name}_total counter")
+
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"weather_{name}_total{label_text(labels)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE weather_{name}_seconds histogram")
+
+            for (histogram, labels), (total, seconds, buckets) in sorted(histograms.items()):
+                if histogram != name:
+                    continue
+
+                cumulative = 0
+
+                for bound, hits in zip(BUCKETS, buckets):
+                    cumulative += hits
+                    bucket = label_text(labels, f'le="{bound}"')
+                    lines.append(f"weather_{name}_seconds_bucket{bucket} {cumulative}")
+
+                bucket = label_text(labels, 'le="+Inf"')
+                lines.append(f"weather_{name}_seconds_bucket{bucket} {total}")
+                lines.append(f"weather_{name}_seconds_sum{label_text(labels)} {seconds}")
+                lines.append(f"weather_{name}_seconds_count{label_text(labels)} {total}")
+
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path:str):
+    """Writes the Prometheus text dump to a file."""
+
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(prometheus_text())
+
+    except Exception as error:
+        logger.error("instrumentation:write_prometheus:%s", error)
+
+@contextmanager
+def capture(prefix:str, top:int = 30):
+    """Profiles this thread and the threads it starts, and traces allocations, into prefix.*."""
+
+    profiles = [cProfile.Profile()]
+    profiles_lock = threading.Lock()
+
+    def profile_thread(*_):
+        """Runs once in each new thread and hands it its own profiler."""
+
+        profile = cProfile.Profile()
+
+        with profiles_lock:
+            profiles.append(profile)
+
+        profile.enable()
+
+    #Worker threads such as download pools and the DB writer each get a profiler, the
+    #parse processes of a process pool are not profiled.
+    threading.setprofile(profile_thread)
+    tracemalloc.start()
+    profiles[0].enable()
+
+    try:
+        yield
+
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+        memory = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        try:
+            with profiles_lock:
+                stats = pstats.Stats(*profiles, stream=io.StringIO())
+
+            stats.dump_stats(prefix + ".prof")
+            stats.sort_stats("cumulative").print_stats(top)
+
+            with open(prefix + ".profile.txt", "w", encoding="utf-8") as file:
+                file.write(f"{len(profiles)} threads profiled\n")
+                file.write(stats.stream.getvalue())
+
+            with open(prefix + ".memory.txt", "w", encoding="utf-8") as file:
+                file.write(f"current {current} bytes, peak {peak} bytes\n")
+
+                for statistic in memory.statistics("lineno")[:top]:
+                    file.write(f"{statistic}\n")
+
+        except Exception as error:
+            logger.error("instrumentation:capture:%s", error)
+
+def statement_label(sql:str) -> str:
+    """Shortens a SQL statement to a stable one-line label for per-statement metrics."""
+
+    return " ".join(sql.split())[:80]
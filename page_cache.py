@@ -0,0 +1,151 @@
+"""This Module stores raw scraped month pages in a content-addressed on-disk cache."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+class PageCache():
+    """On-disk cache of raw month pages keyed by station, year and month."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, directory:str = "page_cache", max_bytes:int = 268435456,
+                 max_entries:int = None):
+        """Intializes an instance of the PageCache class."""
+
+        try:
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self.max_entries = max_entries
+            self.lock = threading.Lock()
+            self.index_path = os.path.join(directory, "index.json")
+            self.entries = {}
+
+            os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+
+            if os.path.exists(self.index_path):
+                with open(self.index_path, encoding="utf-8") as file:
+                    self.entries = json.load(file)
+
+        except Exception as error:
+            self.logger.error("PageCache:init:%s", error)
+
+    def key(self, station:int, year:int, month:int) -> str:
+        """Builds the index key for a month page."""
+
+        return f"{station}/{year:04d}/{month:02d}"
+
+    def blob_path(self, digest:str) -> str:
+        """Returns the file path of a stored page body."""
+
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def get(self, station:int, year:int, month:int) -> tuple:
+        """Returns the cached (body, entry) for a month, or None if it is not cached."""
+
+        try:
+            with self.lock:
+                entry = self.entries.get(self.key(station, year, month))
+
+                if entry is None:
+                    return None
+
+                with open(self.blob_path(entry["digest"]), "rb") as file:
+                    body = file.read()
+
+                entry["accessed"] = time.time()
+                return body, entry
+
+        except Exception as error:
+            self.logger.error("PageCache:get:%s", error)
+
+    def put(self, station:int, year:int, month:int, body:bytes, etag:str = None,
+            last_modified:str = None, fetched_on:date = None):
+        """Stores a month page, its validators and fetch day, evicting old pages past the limits."""
+
+        try:
+            digest = hashlib.sha256(body).hexdigest()
+            path = self.blob_path(digest)
+
+            with self.lock:
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                    with open(path + ".tmp", "wb") as file:
+                        file.write(body)
+
+                    os.replace(path + ".tmp", path)
+
+                self.entries[self.key(station, year, month)] = {
+                    "digest": digest,
+                    "size": len(body),
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "fetched_on": (fetched_on or date.today()).isoformat(),
+                    "accessed": time.time()}
+                self.evict()
+                self.save_index()
+
+        except Exception as error:
+            self.logger.error("PageCache:put:%s", error)
+
+    def evict(self):
+        """Removes the least recently used pages until the cache fits its limits."""
+
+        try:
+            sizes = {}
+            references = Counter()
+
+            for entry in self.entries.values():
+                sizes[entry["digest"]] = entry["size"]
+                references[entry["digest"]] += 1
+
+            total = sum(sizes.values())
+            oldest_first = sorted(self.entries, key=lambda key: self.entries[key]["accessed"])
+
+            for key in oldest_first:
+                if total <= self.max_bytes and (self.max_entries is None
+                                                or len(self.entries) <= self.max_entries):
+                    break
+
+                digest = self.entries.pop(key)["digest"]
+                references[digest] -= 1
+
+                #Blobs are shared by identical pages, only delete unreferenced ones.
+                if references[digest] == 0:
+                    total -= sizes[digest]
+                    os.remove(self.blob_path(digest))
+
+        except Exception as error:
+            self.logger.error("PageCache:evict:%s", error)
+
+    def save_index(self):
+        """Atomically writes the cache index to disk."""
+
+        try:
+            with open(self.index_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(self.entries, file)
+
+            os.replace(self.index_path + ".tmp", self.index_path)
+
+        except Exception as error:
+            self.logger.error("PageCache:save_index:%s", error)
+
+    def clear(self):
+        """Deletes every cached page."""
+
+        try:
+            with self.lock:
+                for digest in {entry["digest"] for entry in self.entries.values()}:
+                    os.remove(self.blob_path(digest))
+
+                self.entries = {}
+                self.save_index()
+
+        except Exception as error:
+            self.logger.error("PageCache:clear:%s", error)
@@ -1,41 +1,301 @@
-"""This Module displays a box graph and a line graph."""
+"""This Module displays or renders a box graph and a line graph."""
 
+import hashlib
+import io
 import logging
-import matplotlib.pyplot as plt
+import os
+import threading
+from collections import OrderedDict
+import instrumentation
+
+def draw_box_plot(axes, start_year:str, end_year:str, data:dict):
+    """Draws a box plot of per-month temperature lists onto the given axes."""
+
+    axes.boxplot(list(data.values()))
+    label_box_plot(axes, start_year, end_year)
+
+def draw_box_plot_from_stats(axes, start_year:str, end_year:str, stats:dict):
+    """Draws a box plot of precomputed per-month statistics onto the given axes."""
+
+    axes.bxp(list(stats.values()), showfliers=False)
+    label_box_plot(axes, start_year, end_year)
+
+def label_box_plot(axes, start_year:str, end_year:str):
+    """Titles and labels a box plot."""
+
+    axes.set_title(f'Monthly temperature distribution for: {start_year} to {end_year}')
+    axes.set_ylabel('Temperature (Celcius)')
+    axes.set_xlabel('Month')
+
+def draw_line_plot(axes, month:str, year:str, data:dict):
+    """Draws a line plot of daily mean temperatures onto the given axes."""
+
+    axes.plot(list(data.keys()), list(data.values()))
+    label_line_plot(axes)
+
+def draw_line_plot_from_series(axes, month:str, year:str, series):
+    """Draws a line plot of a WeatherSeries' daily means straight from its arrays."""
+
+    axes.plot(series.dates(), series.mean_temp)
+    label_line_plot(axes)
+
+def label_line_plot(axes):
+    """Titles and labels a line plot."""
+
+    axes.set_title('Daily Avg Temperatures')
+    axes.set_ylabel('Avg Daily Temp')
+    axes.set_xlabel('Days of Month')
+    axes.tick_params(axis='x', labelrotation=70)
+
+    for label in axes.get_xticklabels():
+        label.set_horizontalalignment('right')
+        label.set_rotation_mode('anchor')
+
+def draw_box_plot_from_series(axes, start_year:str, end_year:str, series):
+    """Draws a box plot of a WeatherSeries' daily means grouped by calendar month."""
+
+    draw_box_plot_from_stats(axes, start_year, end_year, series.box_stats())
+
+def image_format(path:str) -> str:
+    """Returns the image format implied by a file name, defaulting to png."""
+
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return extension or 'png'
+
+class PlotRenderer():
+    """Renders graphs onto Agg figures and caches the encoded images."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, cache_size:int = 32, cache_dir:str = None):
+        """Intializes an instance of the PlotRenderer class."""
+
+        try:
+            self.cache_size = cache_size
+            self.cache_dir = cache_dir
+            self.images = OrderedDict()
+            self.lock = threading.Lock()
+
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:init:%s", error)
+
+    def render(self, draw, *args, fmt:str = 'png') -> bytes:
+        """Draws onto a new figure that never touches pyplot and returns the encoded image."""
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        with instrumentation.span("render", plot=draw.__name__, format=fmt) as timing:
+            figure = Figure()
+            FigureCanvasAgg(figure)
+            draw(figure.subplots(), *args)
+
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format=fmt, bbox_inches='tight')
+            timing.set(bytes=buffer.tell())
+
+        return buffer.getvalue()
+
+    def render_box_plot(self, start_year:str, end_year:str, data:dict, fmt:str = 'png') -> bytes:
+        """Renders a box plot of per-month temperature lists."""
+
+        try:
+            return self.render(draw_box_plot, start_year, end_year, data, fmt=fmt)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:render_box_plot:%s", error)
+
+    def render_box_plot_from_stats(self, start_year:str, end_year:str, stats:dict,
+                                   fmt:str = 'png') -> bytes:
+        """Renders a box plot of precomputed per-month statistics."""
+
+        try:
+            return self.render(draw_box_plot_from_stats, start_year, end_year, stats, fmt=fmt)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:render_box_plot_from_stats:%s", error)
+
+    def render_line_plot(self, month:str, year:str, data:dict, fmt:str = 'png') -> bytes:
+        """Renders a line plot of daily mean temperatures."""
+
+        try:
+            return self.render(draw_line_plot, month, year, data, fmt=fmt)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:render_line_plot:%s", error)
+
+    def render_series(self, kind:str, first:str, second:str, series, fmt:str = 'png') -> bytes:
+        """Renders a 'box' or 'line' plot straight from a WeatherSeries."""
+
+        try:
+            draw = draw_box_plot_from_series if kind == 'box' else draw_line_plot_from_series
+            return self.render(draw, first, second, series, fmt=fmt)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:render_series:%s", error)
+
+    def box_plot(self, dbops, start_year:str, end_year:str, fmt:str = 'png') -> bytes:
+        """Returns a station's box plot, querying and rendering only when its image is stale."""
+
+        try:
+            key = ('box', dbops.dbname, dbops.location, str(start_year), str(end_year), fmt,
+                   dbops.get_data_version())
+
+            return self.cached(key, lambda: self.render_box_plot_from_stats(
+                start_year, end_year, dbops.fetch_box_stats(start_year, end_year), fmt))
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:box_plot:%s", error)
+
+    def line_plot(self, dbops, month:str, year:str, fmt:str = 'png') -> bytes:
+        """Returns a station's line plot, querying and rendering only when its image is stale."""
+
+        try:
+            key = ('line', dbops.dbname, dbops.location, str(month), str(year), fmt,
+                   dbops.get_data_version())
+
+            first_day = f'{int(year):04d}-{int(month):02d}-01'
+            last_day = f'{int(year):04d}-{int(month):02d}-31'
+
+            def produce() -> bytes:
+                series = dbops.fetch_series(first_day, last_day)
+
+                #A month without rows would render empty axes, it fails like an empty box plot.
+                if series is None or len(series) == 0:
+                    self.logger.error("PlotRenderer:line_plot:no rows for %s-%s", year, month)
+                    return None
+
+                return self.render_series('line', month, year, series, fmt)
+
+            return self.cached(key, produce)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:line_plot:%s", error)
+
+    def cached(self, key:tuple, produce) -> bytes:
+        """Looks an image up in memory then on disk, producing and storing it on a miss."""
+
+        #The data version is part of the key, so writes make old images unreachable.
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+        path = os.path.join(self.cache_dir, f"{digest}.{key[5]}") if self.cache_dir else None
+
+        with self.lock:
+            if digest in self.images:
+                self.images.move_to_end(digest)
+                instrumentation.count("render_cache", labels={"result": "memory"})
+                return self.images[digest]
+
+        if path and os.path.exists(path):
+            instrumentation.count("render_cache", labels={"result": "disk"})
+
+            with open(path, "rb") as file:
+                image = file.read()
+
+        else:
+            instrumentation.count("render_cache", labels={"result": "miss"})
+            image = produce()
+
+            if image is None:
+                return None
+
+            if path:
+                self.write(path, image)
+
+        with self.lock:
+            self.images[digest] = image
+
+            while len(self.images) > self.cache_size:
+                self.images.popitem(last=False)
+
+        return image
+
+    def write(self, path:str, image:bytes):
+        """Atomically writes an encoded image to a file."""
+
+        try:
+            with open(path + ".tmp", "wb") as file:
+                file.write(image)
+
+            os.replace(path + ".tmp", path)
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:write:%s", error)
+
+    def clear(self):
+        """Drops every cached image from memory and disk."""
+
+        try:
+            with self.lock:
+                self.images.clear()
+
+                if self.cache_dir:
+                    for name in os.listdir(self.cache_dir):
+                        os.remove(os.path.join(self.cache_dir, name))
+
+        except Exception as error:
+            self.logger.error("PlotRenderer:clear:%s", error)
 
 class PlotOperations():
     """Creates graphs with the mean temperature of the user provided dates."""
 
     logger = logging.getLogger("main." + __name__)
 
-    def create_box_plot(self, start_year:str, end_year:str, data:dict):
+    def __init__(self, renderer:PlotRenderer = None):
+        """Intializes an instance of the PlotOperations class."""
+
+        self.renderer = renderer or PlotRenderer()
+
+    def create_box_plot(self, start_year:str, end_year:str, data:dict, output:str = None):
         """Creates a box plot based on the data provided by the user."""
 
         try:
-            hitest = list(data.values())
-
-            plt.boxplot(hitest)
-            plt.title(f'Monthly temperature distribution for: {start_year} to {end_year}')
-            plt.ylabel('Temperature (Celcius)')
-            plt.xlabel('Month')
-            plt.show()
+            self.finish(draw_box_plot, output, start_year, end_year, data)
 
         except Exception as error:
             self.logger.error("PlotOps:boxplot:%s", error)
 
-    def create_line_plot(self, month:str, year:str, data:dict):
-        """Creates a line plot based on the data provided by the user."""
+    def create_box_plot_from_stats(self, start_year:str, end_year:str, stats:dict,
+                                   output:str = None):
+        """Creates a box plot from precomputed per-month statistics."""
 
         try:
-            dates = list(data.keys())
-            temps = list(data.values())
+            self.finish(draw_box_plot_from_stats, output, start_year, end_year, stats)
 
-            plt.plot(dates, temps)
-            plt.title('Daily Avg Temperatures')
-            plt.ylabel('Avg Daily Temp')
-            plt.xlabel('Days of Month')
-            plt.xticks(rotation = 70, horizontalalignment = 'right', rotation_mode = 'anchor')
-            plt.show()
+        except Exception as error:
+            self.logger.error("PlotOps:boxplot_stats:%s", error)
+
+    def create_line_plot(self, month:str, year:str, data:dict, output:str = None):
+        """Creates a line plot based on the data provided by the user."""
+
+        try:
+            self.finish(draw_line_plot, output, month, year, data)
 
         except Exception as error:
             self.logger.error("PlotOps:lineplot:%s", error)
+
+    def create_plot_from_series(self, kind:str, first:str, second:str, series, output:str = None):
+        """Creates a year range 'box' plot or a month 'line' plot from a WeatherSeries."""
+
+        try:
+            draw = draw_box_plot_from_series if kind == 'box' else draw_line_plot_from_series
+            self.finish(draw, output, first, second, series)
+
+        except Exception as error:
+            self.logger.error("PlotOps:series:%s", error)
+
+    def finish(self, draw, output:str, *args):
+        """Shows the graph in its own window, or renders it off-screen to a given output file."""
+
+        if output:
+            self.renderer.write(output, self.renderer.render(draw, *args, fmt=image_format(output)))
+            return
+
+        import matplotlib.pyplot as plt
+
+        #A fresh figure per graph keeps earlier plots from drawing onto the same axes.
+        figure = plt.figure()
+        draw(figure.subplots(), *args)
+        plt.show()
@@ -0,0 +1,95 @@
+"""This Module coalesces scrape and save progress into rate-limited pubsub messages."""
+
+import logging
+import threading
+import time
+from pubsub import pub
+
+class ProgressReporter():
+    """Counts work as it happens and publishes at most one update per interval."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, phase:str, total:int = None, topic:str = 'load',
+                 min_interval:float = 0.1, min_count:int = 1):
+        """Intializes an instance of the ProgressReporter class."""
+
+        try:
+            self.phase = phase
+            self.topic = topic
+            self.min_interval = min_interval
+            self.min_count = min_count
+            self.lock = threading.Lock()
+            self.start(total)
+
+        except Exception as error:
+            self.logger.error("ProgressReporter:init:%s", error)
+
+    def start(self, total:int = None):
+        """Resets the counters for a new run of the given total size."""
+
+        with self.lock:
+            self.total = total
+            self.done = 0
+            self.bytes = 0
+            self.rows = 0
+            self.started = time.monotonic()
+            self.last_sent = 0
+            self.last_done = 0
+
+    def advance(self, count:int = 1, nbytes:int = 0, rows:int = 0):
+        """Records finished work and publishes an update if the interval and count allow it."""
+
+        try:
+            with self.lock:
+                self.done += count
+                self.bytes += nbytes
+                self.rows += rows
+                now = time.monotonic()
+
+                if (now - self.last_sent < self.min_interval
+                        or self.done - self.last_done < self.min_count):
+                    return
+
+                self.last_sent = now
+                self.last_done = self.done
+                payload = self.payload(now)
+
+            pub.sendMessage(self.topic, counter=payload['done'], progress=payload)
+
+        except Exception as error:
+            self.logger.error("ProgressReporter:advance:%s", error)
+
+    def finish(self):
+        """Publishes the final counts regardless of the rate limit."""
+
+        try:
+            with self.lock:
+                self.last_sent = time.monotonic()
+                self.last_done = self.done
+                payload = self.payload(self.last_sent)
+
+            pub.sendMessage(self.topic, counter=payload['done'], progress=payload)
+
+        except Exception as error:
+            self.logger.error("ProgressReporter:finish:%s", error)
+
+    def payload(self, now:float) -> dict:
+        """Builds the message describing the current progress."""
+
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = None
+
+        if self.total and rate:
+            eta = max(self.total - self.done, 0) / rate
+
+        return {'phase': self.phase,
+                'done': self.done,
+                'total': self.total,
+                'elapsed': elapsed,
+                'bytes': self.bytes,
+                'rows': self.rows,
+                'bytes_per_second': self.bytes / elapsed,
+                'rows_per_second': self.rows / elapsed,
+                'eta': eta}
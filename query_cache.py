@@ -0,0 +1,110 @@
+"""This Module caches read query results until their station's data version changes."""
+
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+import instrumentation
+
+class QueryCache():
+    """Process-wide LRU cache of read query results stamped with their station's data version."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, max_entries:int = 256, ttl:float = 300.0):
+        """Intializes an instance of the QueryCache class."""
+
+        try:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self.entries = OrderedDict()
+            self.lock = threading.Lock()
+            self.counts = {"hit": 0, "miss": 0, "stale": 0, "expired": 0}
+
+        except Exception as error:
+            self.logger.error("QueryCache:init:%s", error)
+
+    def get(self, key:tuple, version:int) -> tuple:
+        """Returns (True, value) for a live entry of the same data version, else (False, None)."""
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                result = "miss"
+
+            elif entry[0] != version:
+                result = "stale"
+
+            elif time.monotonic() - entry[1] > self.ttl:
+                result = "expired"
+
+            else:
+                self.entries.move_to_end(key)
+                result = "hit"
+
+            if result != "hit":
+                self.entries.pop(key, None)
+
+            self.counts[result] += 1
+
+        instrumentation.count("query_cache", labels={"result": result})
+        return (True, entry[2]) if result == "hit" else (False, None)
+
+    def put(self, key:tuple, version:int, value):
+        """Stores a result, evicting the least recently used entries past the size limit."""
+
+        with self.lock:
+            self.entries[key] = (version, time.monotonic(), value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Returns the hit, miss, stale and expired counts and the current size."""
+
+        with self.lock:
+            lookups = sum(self.counts.values())
+            return dict(self.counts, entries=len(self.entries),
+                        hit_rate=self.counts["hit"] / lookups if lookups else 0.0)
+
+    def clear(self):
+        """Drops every entry and resets the statistics."""
+
+        with self.lock:
+            self.entries.clear()
+            self.counts = dict.fromkeys(self.counts, 0)
+
+QUERY_CACHE = QueryCache()
+
+def cached_query(method):
+    """Serves a DBOperations read method from QUERY_CACHE until the station's data changes."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.cached:
+            return method(self, *args, **kwargs)
+
+        version = self.get_data_version()
+
+        if version is None:
+            return method(self, *args, **kwargs)
+
+        key = (self.dbname, self.location, method.__name__, args, tuple(sorted(kwargs.items())))
+        found, value = QUERY_CACHE.get(key, version)
+
+        #Hits hand back the stored object itself, callers must treat results as read-only.
+        if found:
+            return value
+
+        value = method(self, *args, **kwargs)
+
+        #Failed reads return None and are retried on the next call.
+        if value is not None:
+            QUERY_CACHE.put(key, version, value)
+
+        return value
+
+    return wrapper
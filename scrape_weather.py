@@ -1,29 +1,140 @@
 """This Module scrapes weather data for max, min and mean."""
 
+import calendar
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html import unescape
 from html.parser import HTMLParser
 import logging
-import urllib.request
-from pubsub import pub
-from datetime import datetime
+import multiprocessing
+import os
+import re
+from datetime import date, datetime
+import instrumentation
+from http_session import HTTPSession
+from page_cache import PageCache
+from progress import ProgressReporter
+from stations import DEFAULT_STATION, Station
+
+BASE_URL = "https://climate.weather.gc.ca/climate_data/daily_data_e.html"
+
+MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_name) if name}
+TBODY = re.compile(r"<tbody[^>]*>(.*?)</tbody>", re.S | re.I)
+ROW = re.compile(r"<tr[^>]*>(.*?)</tr>", re.S | re.I)
+ROW_DATE = re.compile(r'<abbr[^>]*title="([A-Za-z]+) (\d{1,2}), (\d{4})"')
+CELL = re.compile(r"<td[^>]*>(?:<(?!/td)[^>]*>)*([^<]*)", re.I)
+LAST_PAGE = re.compile(r'class="previous disabled"')
+
+def extract_records(page) -> tuple:
+    """Extracts ([(date, max, min, mean)], is_last_page) from a daily data page."""
+
+    if isinstance(page, bytes):
+        page = page.decode("utf-8", errors="replace")
+
+    records = []
+    body = TBODY.search(page)
+
+    for row in ROW.finditer(page, *body.span(1)) if body else ():
+        row = row.group(1)
+        date_match = ROW_DATE.search(row)
+
+        #The summary rows follow the last day of the month.
+        if date_match is None:
+            if ">Sum<" in row:
+                break
+
+            continue
+
+        cells = CELL.findall(row, date_match.end())
+
+        if len(cells) >= 3:
+            name, day, year = date_match.groups()
+            records.append((f"{year}-{MONTH_NUMBERS[name]:02d}-{int(day):02d}",
+                            unescape(cells[0]), unescape(cells[1]), unescape(cells[2])))
+
+    return records, LAST_PAGE.search(page) is not None
+
+def extract_daily_table(page) -> tuple:
+    """Extracts ({date: {'Max', 'Min', 'Mean'}}, is_last_page) from a daily data page."""
+
+    records, last_page = extract_records(page)
+    weather = {record[0]: {'Max': record[1], 'Min': record[2], 'Mean': record[3]}
+               for record in records}
+
+    return weather, last_page
+
+def extract_month_batch(batch:list) -> list:
+    """Parses a chunk of (year, month, page) tuples into compact (year, month, records) tuples."""
+
+    return [(year, month, extract_records(page)[0]) for year, month, page in batch]
+
+def parse_pool(max_workers:int = None) -> ProcessPoolExecutor:
+    """Creates a process pool for parse_pages, sized to the CPU count by default."""
+
+    #Spawned workers start clean instead of forking a process that runs HTTP and writer threads.
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def parse_pages(pages, max_workers:int = None, chunksize:int = 4,
+                executor:ProcessPoolExecutor = None):
+    """Yields (year, month, records) in input order, parsed on a shared or private process pool."""
+
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if executor is None:
+        with parse_pool(max_workers) as executor:
+            yield from parse_pages(pages, max_workers, chunksize, executor)
+
+        return
+
+    pending = deque()
+    batch = []
+
+    for page in pages:
+        batch.append(page)
+
+        if len(batch) >= chunksize:
+            pending.append(executor.submit(extract_month_batch, batch))
+            batch = []
+
+        #Bounds how many parsed chunks wait in memory for the consumer.
+        if len(pending) >= max_workers * 2:
+            yield from pending.popleft().result()
+
+    if batch:
+        pending.append(executor.submit(extract_month_batch, batch))
+
+    while pending:
+        yield from pending.popleft().result()
 
 class WeatherScraper(HTMLParser):
     """Weather data HTML scraper."""
 
     logger = logging.getLogger("main." + __name__)
 
-    def __init__(self):
+    def __init__(self, base_url:str = BASE_URL, first_month:date = None, session:HTTPSession = None,
+                 cache:PageCache = None, station:Station = DEFAULT_STATION):
         """Intializes an instance of the WeatherScraper class."""
         try:
             super().__init__()
+            self.base_url = base_url
+            self.station = station
+            self.station_id = station.station_id
+            self.first_month = first_month or station.first_month
+            self.session = session or HTTPSession()
+            self.cache = cache
+            self.failed_months = []
             self.tbody = False
             self.tr = False
             self.td = False
+            self.cell_filled = False
             self.counter = 0
             self.daily_temps = {}
             self.weather = {}
             self.row_date = ""
             self.last_page = False
             self.month_counter = 0
+            self.progress = ProgressReporter('download')
 
         except Exception as error:
             self.logger.error("scrape:init:%s", error)
@@ -41,9 +152,10 @@ class WeatherScraper(HTMLParser):
             if tag == "td" and self.tr is True:
                 self.counter += 1
                 self.td = True
+                self.cell_filled = False
 
-            #Translates abbr tag into the desired date format.
-            if tag == "abbr" and self.tr is True:
+            #Translates the row header abbr tag into the desired date format.
+            if tag == "abbr" and self.tr is True and self.td is False:
                 self.row_date = str(datetime.strptime(attrs[0][1], "%B %d, %Y").date())
 
             #Detects last page.
@@ -75,10 +187,12 @@ class WeatherScraper(HTMLParser):
             if data == "Sum":
                 self.tbody = False
 
-            #Populates daily_temps dict.
-            if self.td is True and self.counter <= 3 and self.tbody is True:
+            #Populates daily_temps dict, flags such as an estimated 'E' after the value are ignored.
+            if (self.td is True and self.counter <= 3 and self.tbody is True
+                    and not self.cell_filled):
                 keys = ['Max', 'Min', 'Mean']
                 self.daily_temps[keys[self.counter - 1]] = data
+                self.cell_filled = True
 
             #Populates weather dict.
             if self.counter == 3:
@@ -93,11 +207,12 @@ class WeatherScraper(HTMLParser):
 
         try:
             today  = datetime.now()
+            self.progress.start()
 
             while self.last_page is False:
 
                 try:
-                    url = (f'https://climate.weather.gc.ca/climate_data/daily_data_e.html?StationID=27174&timeframe=2&StartYear=1840&EndYear=2018&Day={today.day}&Year={today.year}&Month={today.month}#')
+                    month = (today.year, today.month)
 
                     if today.month == 1:
                         today = today.replace(month=12)
@@ -106,18 +221,19 @@ class WeatherScraper(HTMLParser):
                     else:
                         today = today.replace(month=today.month-1)
 
-                    with urllib.request.urlopen(url) as response:
-                        html = str(response.read())
+                    html = self.fetch_month(*month)
 
                     self.month_counter += 1
 
-                    self.feed(html)
+                    weather = self.merge_page(html)
 
-                    pub.sendMessage('load', counter=self.month_counter)
+                    self.progress.advance(1, len(html), len(weather))
 
                 except Exception as error:
+                    self.failed_months.append(month)
                     self.logger.error("scrape:get_data loop 1:%s", error)
 
+            self.progress.finish()
             return self.weather
 
         except Exception as error:
@@ -129,6 +245,7 @@ class WeatherScraper(HTMLParser):
         try:
             today = datetime.now().date()
             completed = False
+            self.progress.start((today.year - enddate.year) * 12 + today.month - enddate.month + 1)
 
             while not completed:
 
@@ -136,7 +253,7 @@ class WeatherScraper(HTMLParser):
                     if(enddate.month == today.month) and (enddate.year == today.year):
                         completed = True
 
-                    url = (f'https://climate.weather.gc.ca/climate_data/daily_data_e.html?StationID=27174&timeframe=2&StartYear=1840&EndYear=2018&Day={today.day}&Year={today.year}&Month={today.month}#')
+                    month = (today.year, today.month)
 
                     if today.month == 1:
                         today = today.replace(month=12)
@@ -145,23 +262,267 @@ class WeatherScraper(HTMLParser):
                     else:
                         today = today.replace(month=today.month-1)
 
-                    with urllib.request.urlopen(url) as response:
-                        html = str(response.read())
+                    html = self.fetch_month(*month)
 
                     self.month_counter += 1
-                    
-                    self.feed(html)
 
-                    pub.sendMessage('load', counter=self.month_counter)
+                    weather = self.merge_page(html)
+
+                    self.progress.advance(1, len(html), len(weather))
 
                 except Exception as error:
+                    self.failed_months.append(month)
                     self.logger.error("scrape:update loop 1:%s", error)
 
+            self.progress.finish()
             return self.weather
 
         except Exception as error:
             self.logger.error("scrape:update:%s", error)
 
+    def build_url(self, year:int, month:int, day:int = 1) -> str:
+        """Builds the daily data url for the given month."""
+
+        return (f'{self.base_url}?StationID={self.station_id}&timeframe=2&StartYear=1840'
+                f'&EndYear=2018&Day={day}&Year={year}&Month={month}#')
+
+    def month_list(self, enddate:date = None) -> list:
+        """Lists every (year, month) from this month back to and including the end month."""
+
+        try:
+            months = []
+            enddate = enddate or self.first_month
+            year, month = datetime.now().year, datetime.now().month
+
+            while (year, month) >= (enddate.year, enddate.month):
+                months.append((year, month))
+
+                if month == 1:
+                    year, month = year - 1, 12
+
+                else:
+                    month -= 1
+
+            return months
+
+        except Exception as error:
+            self.logger.error("scrape:month_list:%s", error)
+
+    def fetch_month(self, year:int, month:int) -> bytes:
+        """Returns the page for a month, from the cache when the cached copy cannot change."""
+
+        cached = self.cache.get(self.station_id, year, month) if self.cache else None
+        today = date.today()
+        recent = (year * 12 + month) >= (today.year * 12 + today.month - 1)
+
+        #A page saved while its month was still open may be partial, only later fetches are final.
+        month_end = date(year, month, calendar.monthrange(year, month)[1])
+        fetched_on = cached[1].get("fetched_on") if cached is not None else None
+        final = fetched_on is not None and date.fromisoformat(fetched_on) > month_end
+
+        if cached is not None and final and not recent:
+            instrumentation.count("page_cache", labels={"result": "hit"})
+            return cached[0]
+
+        headers = {}
+
+        #Recent months and pages cached before their month ended are revalidated.
+        if cached is not None:
+            if cached[1]["etag"]:
+                headers["If-None-Match"] = cached[1]["etag"]
+
+            if cached[1]["last_modified"]:
+                headers["If-Modified-Since"] = cached[1]["last_modified"]
+
+        response = self.session.get(self.build_url(year, month), headers)
+
+        if response.status == 304 and cached is not None:
+            instrumentation.count("page_cache", labels={"result": "revalidated"})
+
+            #Records the revalidation so a closed month is served from disk next time.
+            self.cache.put(self.station_id, year, month, cached[0],
+                           response.headers.get("etag", cached[1]["etag"]),
+                           response.headers.get("last-modified", cached[1]["last_modified"]),
+                           today)
+            return cached[0]
+
+        instrumentation.count("page_cache", labels={"result": "miss"})
+
+        if self.cache:
+            self.cache.put(self.station_id, year, month, response.body,
+                           response.headers.get("etag"), response.headers.get("last-modified"),
+                           today)
+
+        return response.body
+
+    def fetch_page(self, year:int, month:int) -> bytes:
+        """Downloads the page for a single month, returns None if it could not be fetched."""
+
+        try:
+            return self.fetch_month(year, month)
+
+        except Exception as error:
+            self.failed_months.append((year, month))
+            self.logger.error("scrape:fetch_page %s-%s:%s", year, month, error)
+
+    def iter_pages(self, months:list, max_workers:int = 8):
+        """Yields (year, month, html) in month order while a bounded pool downloads ahead."""
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            pending = deque()
+
+            for month in months:
+                pending.append((month, executor.submit(self.fetch_page, *month)))
+
+                #Keeps at most two pages per worker in flight.
+                if len(pending) >= max(1, max_workers) * 2:
+                    month, future = pending.popleft()
+                    yield month[0], month[1], future.result()
+
+            while pending:
+                month, future = pending.popleft()
+                yield month[0], month[1], future.result()
+
+    def get_data_concurrent(self, max_workers:int = 8, enddate:date = None) -> dict:
+        """Downloads every month through a bounded thread pool, returns the weather data."""
+
+        try:
+            months = self.month_list(enddate)
+            self.progress.start(len(months))
+
+            #Pages are fed in month order so the merge matches the serial scrape.
+            for _, _, html in self.iter_pages(months, max_workers):
+                try:
+                    self.month_counter += 1
+
+                    if html is not None:
+                        self.progress.advance(1, len(html), len(self.merge_page(html)))
+
+                    else:
+                        self.progress.advance(1)
+
+                except Exception as error:
+                    self.logger.error("scrape:get_data_concurrent loop 1:%s", error)
+
+            self.progress.finish()
+            return self.weather
+
+        except Exception as error:
+            self.logger.error("scrape:get_data_concurrent:%s", error)
+
+    def parse_page(self, page:bytes) -> dict:
+        """Parses a single month page, returns only that month's weather data."""
+
+        with instrumentation.span("parse", bytes=len(page)) as timing:
+            weather = extract_daily_table(page)[0]
+            timing.set(rows=len(weather))
+
+        instrumentation.count("rows_parsed", len(weather))
+        return weather
+
+    def merge_page(self, page:bytes) -> dict:
+        """Parses a month page into self.weather and notes whether it is the oldest month."""
+
+        with instrumentation.span("parse", bytes=len(page)) as timing:
+            weather, last_page = extract_daily_table(page)
+            timing.set(rows=len(weather))
+
+        instrumentation.count("rows_parsed", len(weather))
+        self.weather.update(weather)
+        self.last_page = self.last_page or last_page
+        return weather
+
+    def reference_parse(self, page:bytes) -> dict:
+        """Parses a month page with the HTMLParser event handlers, used to check the extractor."""
+
+        weather, self.weather = self.weather, {}
+
+        try:
+            self.feed(page.decode("utf-8", errors="replace") if isinstance(page, bytes) else page)
+            return self.weather
+
+        finally:
+            self.weather = weather
+
+    def raise_failed(self, start:int = 0):
+        """Raises if any month recorded since start could not be downloaded or parsed."""
+
+        failed = self.failed_months[start:]
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} months failed: "
+                               + ", ".join(f"{year}-{month:02d}" for year, month in sorted(failed)))
+
+    def iter_months(self, months:list = None, max_workers:int = 8):
+        """Yields (year, month, weather data) batches as each month is downloaded and parsed."""
+
+        try:
+            failed = len(self.failed_months)
+            months = self.month_list() if months is None else months
+            self.progress.start(len(months))
+
+            for year, month, html in self.iter_pages(months, max_workers):
+                try:
+                    self.month_counter += 1
+
+                    if html is None:
+                        self.progress.advance(1)
+                        continue
+
+                    weather = self.parse_page(html)
+                    yield year, month, weather
+                    self.progress.advance(1, len(html), len(weather))
+
+                except Exception as error:
+                    self.failed_months.append((year, month))
+                    self.logger.error("scrape:iter_months loop 1:%s", error)
+
+            self.progress.finish()
+
+            #Failed months end the stream with an error once the others are yielded, so the
+            #caller keeps its checkpoints and reports the run as failed.
+            self.raise_failed(failed)
+
+        except Exception as error:
+            #Re-raised so the consumer can tell an aborted stream from a finished one.
+            self.logger.error("scrape:iter_months:%s", error)
+            raise
+
+    def iter_fetched(self, months:list, max_workers:int = 8):
+        """Yields the (year, month, page) tuples that downloaded, counting their bytes."""
+
+        for year, month, page in self.iter_pages(months, max_workers):
+            if page is None:
+                self.progress.advance(1)
+
+            else:
+                self.progress.advance(0, len(page))
+                yield year, month, page
+
+    def iter_months_parallel(self, months:list = None, max_workers:int = 8,
+                             parse_workers:int = None, chunksize:int = 4,
+                             executor:ProcessPoolExecutor = None):
+        """Yields (year, month, records) batches with parsing spread over a process pool."""
+
+        try:
+            failed = len(self.failed_months)
+            months = self.month_list() if months is None else months
+            self.progress.start(len(months))
+            pages = self.iter_fetched(months, max_workers)
+
+            for year, month, records in parse_pages(pages, parse_workers, chunksize, executor):
+                self.month_counter += 1
+                instrumentation.count("rows_parsed", len(records))
+                yield year, month, records
+                self.progress.advance(1, rows=len(records))
+
+            self.progress.finish()
+            self.raise_failed(failed)
+
+        except Exception as error:
+            self.logger.error("scrape:iter_months_parallel:%s", error)
+            raise
+
 #Test Program.
 if __name__ == "__main__":
     test = WeatherScraper().get_data()
@@ -0,0 +1,155 @@
+"""This Module writes and memory-maps the versioned binary snapshot of each station's data."""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import date
+import numpy
+from weather_series import WeatherSeries
+
+#File layout: MAGIC, format version and header length, a JSON header index padded to ALIGN,
+#then per station a dense int32 ordinal array, a (3, days) float32 max/min/mean block and
+#a uint8 array marking the days that have a row, each starting on an ALIGN boundary.
+MAGIC = b"WXSNAP\0\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+ARRAYS = ("ordinals", "values", "present")
+
+write_locks = {}
+write_locks_guard = threading.Lock()
+
+def aligned(offset:int) -> int:
+    """Rounds an offset up to the next ALIGN boundary."""
+
+    return -(-offset // ALIGN) * ALIGN
+
+def densify(series:WeatherSeries) -> tuple:
+    """Spreads a series over one slot per calendar day, NaN and not present on missing days."""
+
+    first = int(series.ordinals[0])
+    ordinals = numpy.arange(first, int(series.ordinals[-1]) + 1, dtype=numpy.int32)
+    values = numpy.full((3, len(ordinals)), numpy.nan, dtype=numpy.float32)
+    present = numpy.zeros(len(ordinals), dtype=numpy.uint8)
+    values[:, series.ordinals - first] = series.values
+    present[series.ordinals - first] = 1
+
+    return ordinals, values, present
+
+def write_snapshot(path:str, blocks:dict):
+    """Atomically writes {station: (data version, ordinals, values, present)} to a snapshot."""
+
+    with write_locks_guard:
+        lock = write_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    with lock:
+        stations = {}
+        offset = 0
+
+        for station, (version, *arrays) in blocks.items():
+            stations[station] = {"version": version, "first": int(arrays[0][0]),
+                                 "days": len(arrays[0])}
+
+            for name, array in zip(ARRAYS, arrays):
+                stations[station][name] = offset
+                offset = aligned(offset + array.nbytes)
+
+        header = json.dumps({"stations": stations}).encode("utf-8")
+        data_start = aligned(PREAMBLE.size + len(header))
+
+        #Readers keep mapping the old file until they reopen, replace never truncates it under them.
+        with open(path + ".tmp", "wb") as file:
+            file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            file.write(header)
+
+            for station, (version, *arrays) in blocks.items():
+                for name, array in zip(ARRAYS, arrays):
+                    file.seek(data_start + stations[station][name])
+                    file.write(memoryview(numpy.ascontiguousarray(array)).cast("B"))
+
+            file.truncate(data_start + offset)
+
+        os.replace(path + ".tmp", path)
+
+class Snapshot():
+    """Read-only, zero-copy view of a snapshot file."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, path:str):
+        """Intializes an instance of the Snapshot class, rejecting foreign or newer files."""
+
+        self.path = path
+
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = PREAMBLE.unpack_from(self.map, 0)
+
+        if magic != MAGIC or version > FORMAT_VERSION:
+            self.map.close()
+            raise ValueError(f"Unsupported snapshot: {path}")
+
+        header = json.loads(self.map[PREAMBLE.size:PREAMBLE.size + header_length])
+        self.stations = header["stations"]
+        self.data_start = aligned(PREAMBLE.size + header_length)
+
+    def __enter__(self) -> 'Snapshot':
+        """Returns the open snapshot."""
+
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the snapshot."""
+
+        self.close()
+
+    def version(self, station:str) -> int:
+        """Returns the data version a station was exported at, or None if it is not present."""
+
+        entry = self.stations.get(station)
+        return entry["version"] if entry else None
+
+    def block(self, station:str) -> tuple:
+        """Returns a station's (data version, ordinals, values, present) arrays from the map."""
+
+        entry = self.stations[station]
+        days = entry["days"]
+        start = self.data_start
+        ordinals = numpy.frombuffer(self.map, numpy.int32, days, start + entry["ordinals"])
+        values = numpy.frombuffer(self.map, numpy.float32, 3 * days, start + entry["values"])
+        present = numpy.frombuffer(self.map, numpy.uint8, days, start + entry["present"])
+
+        return entry["version"], ordinals, values.reshape(3, days), present
+
+    def series(self, station:str, start_date:str = None, end_date:str = None) -> WeatherSeries:
+        """Returns a station's days between two ISO dates as a WeatherSeries view in O(1)."""
+
+        try:
+            days = self.stations[station]["days"]
+            first = self.stations[station]["first"]
+            _, ordinals, values, _ = self.block(station)
+
+            #One slot per calendar day, so a date maps straight to its index.
+            low = max(date.fromisoformat(start_date).toordinal() - first, 0) if start_date else 0
+            high = (min(date.fromisoformat(end_date).toordinal() - first + 1, days)
+                    if end_date else days)
+            high = max(high, low)
+
+            return WeatherSeries.from_arrays(ordinals[low:high], values[:, low:high], station)
+
+        except Exception as error:
+            self.logger.error("Snapshot:series:%s", error)
+
+    def close(self):
+        """Unmaps the file once no arrays handed out still point into it."""
+
+        try:
+            self.map.close()
+
+        except BufferError:
+            #Live views keep the mapping, it is released when they are collected.
+            pass
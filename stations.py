@@ -0,0 +1,61 @@
+"""This Module keeps the registry of weather stations that can be scraped."""
+
+import json
+import logging
+from datetime import date
+
+logger = logging.getLogger("main." + __name__)
+
+class Station():
+    """A climate station and the first month it has daily data for."""
+
+    def __init__(self, station_id:int, name:str, first_month:date):
+        """Intializes an instance of the Station class."""
+        self.station_id = station_id
+        self.name = name
+        self.first_month = first_month
+
+    def __repr__(self) -> str:
+        """Returns a readable representation of the station."""
+        return f"Station({self.station_id}, {self.name!r}, {self.first_month})"
+
+DEFAULT_STATION = Station(27174, "Winnipeg, MB", date(1996, 10, 1))
+
+STATIONS = {DEFAULT_STATION.name: DEFAULT_STATION}
+
+def register_station(station:Station):
+    """Adds a station to the registry, replacing any station with the same name."""
+
+    STATIONS[station.name] = station
+
+def get_station(key) -> Station:
+    """Finds a registered station by name or station id."""
+
+    if key in STATIONS:
+        return STATIONS[key]
+
+    for station in STATIONS.values():
+        if str(station.station_id) == str(key):
+            return station
+
+    raise KeyError(f"Unknown station: {key}")
+
+def load_stations(path:str) -> list:
+    """Registers the stations listed in a JSON file of {station_id, name, first_month} objects."""
+
+    try:
+        with open(path, encoding="utf-8") as file:
+            entries = json.load(file)
+
+        stations = [Station(int(entry["station_id"]), entry["name"],
+                            date.fromisoformat(entry["first_month"]))
+                    for entry in entries]
+
+        for station in stations:
+            register_station(station)
+
+        return stations
+
+    except Exception as error:
+        logger.error("stations:load_stations:%s", error)
+        return []
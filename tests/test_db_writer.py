@@ -0,0 +1,56 @@
+"""Checks that the writer thread settles every future of a group that fails to commit."""
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from connection_pool import ConnectionPool
+from db_writer import DBWriter
+
+class DBWriterTest(unittest.TestCase):
+    """Runs groups of work items on a writer's connection."""
+
+    def setUp(self):
+        """Starts a writer on an empty database in a temporary directory."""
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbname = os.path.join(self.directory.name, "weather.sqlite")
+        self.writer = DBWriter(self.dbname)
+
+    def tearDown(self):
+        """Stops the writer and removes the temporary database."""
+
+        self.writer.stop()
+        ConnectionPool.for_database(self.dbname).close()
+        self.directory.cleanup()
+
+    def test_queued_work_commits(self):
+        """Submitted work resolves to its result once committed."""
+
+        self.writer.submit(lambda cursor: cursor.execute("CREATE TABLE t (x integer);")).result(5)
+        future = self.writer.submit(lambda cursor: cursor.execute("INSERT INTO t VALUES (1);")
+                                    .rowcount)
+
+        self.assertEqual(future.result(5), 1)
+
+    def test_failed_group_settles_every_future(self):
+        """Work that ends the transaction fails its group, later items fail rather than hang."""
+
+        connection = ConnectionPool.for_database(self.dbname).connect()
+        group = [(lambda cursor: cursor.execute("COMMIT;"), Future()),
+                 (lambda cursor: 1, Future()),
+                 (lambda cursor: 2, Future())]
+        group[2][1].cancel()
+
+        try:
+            self.writer.commit_group(connection, group)
+
+        finally:
+            connection.close()
+
+        self.assertIsNotNone(group[0][1].exception(0))
+        self.assertIsNotNone(group[1][1].exception(0))
+        self.assertTrue(group[2][1].cancelled())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Checks the daily table extractor against saved month pages and their expected tables."""
+
+import json
+import os
+import unittest
+from scrape_weather import extract_daily_table
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def load_fixture(stem:str) -> tuple:
+    """Returns the (page bytes, expected table, expected last page flag) of a saved month."""
+
+    with open(os.path.join(FIXTURES, stem + ".html"), "rb") as file:
+        page = file.read()
+
+    with open(os.path.join(FIXTURES, stem + ".json"), encoding="utf-8") as file:
+        expected = json.load(file)
+
+    return page, expected["weather"], expected["last_page"]
+
+class ExtractDailyTableTest(unittest.TestCase):
+    """Saved pages cover flagged, missing and blank cells, the oldest month and a partial month."""
+
+    def check(self, stem:str) -> dict:
+        """Extracts a saved page, compares it with its expected table and returns the table."""
+
+        page, expected, last_page = load_fixture(stem)
+        weather, is_last_page = extract_daily_table(page)
+
+        self.assertEqual(weather, expected)
+        self.assertEqual(list(weather), list(expected))
+        self.assertIs(is_last_page, last_page)
+
+        return weather
+
+    def test_flags_missing_and_blank_cells(self):
+        """An E flag keeps its value, M stays M and &nbsp; becomes a non-breaking space."""
+
+        weather = self.check("daily_2018_05")
+
+        self.assertEqual(len(weather), 31)
+        self.assertEqual(weather["2018-05-03"]["Max"], "21.4")
+        self.assertEqual(weather["2018-05-08"], {"Max": "M", "Min": "4.1", "Mean": "M"})
+        self.assertEqual(weather["2018-05-14"]["Min"], "\xa0")
+        self.assertEqual(weather["2018-05-22"], {"Max": "12.5", "Min": "-0.3", "Mean": "6.1"})
+
+    def test_oldest_month_is_the_last_page(self):
+        """The station's first month disables the previous link."""
+
+        weather = self.check("daily_1996_10")
+
+        self.assertEqual(weather["1996-10-01"], {"Max": "\xa0", "Min": "\xa0", "Mean": "\xa0"})
+        self.assertEqual(weather["1996-10-10"], {"Max": "M", "Min": "M", "Mean": "M"})
+
+    def test_partial_current_month(self):
+        """Days that have not happened yet are extracted as blank rows."""
+
+        weather = self.check("daily_2026_10")
+
+        self.assertEqual(weather["2026-10-17"], {"Max": "9.8", "Min": "1.2", "Mean": "5.5"})
+        self.assertEqual(weather["2026-10-31"]["Mean"], "\xa0")
+
+    def test_string_and_bytes_pages_agree(self):
+        """A page decoded by the caller extracts the same as its raw bytes."""
+
+        page, expected, _ = load_fixture("daily_2018_05")
+
+        self.assertEqual(extract_daily_table(page.decode("utf-8"))[0], expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Checks that months which fail to download fail the stream after the others are saved."""
+
+import os
+import tempfile
+import unittest
+from datetime import date
+from db_operations import DBOperations
+from http_session import HTTPSession
+from page_cache import PageCache
+from scrape_weather import WeatherScraper
+from tests.test_extract_daily_table import load_fixture
+
+#May is served from the page cache, April goes to a port nothing listens on.
+MONTHS = [(2018, 5), (2018, 4)]
+
+class FailedMonthsTest(unittest.TestCase):
+    """Streams one cached month and one month whose download is refused."""
+
+    def setUp(self):
+        """Caches the saved May 2018 page and points the scraper at a closed port."""
+
+        self.directory = tempfile.TemporaryDirectory()
+        cache = PageCache(os.path.join(self.directory.name, "page_cache"))
+        self.scraper = WeatherScraper(base_url="http://127.0.0.1:9/daily_data_e.html",
+                                      session=HTTPSession(timeout=5, retries=0), cache=cache)
+        cache.put(self.scraper.station_id, 2018, 5, load_fixture("daily_2018_05")[0],
+                  fetched_on=date(2018, 6, 2))
+
+        self.dbops = DBOperations(os.path.join(self.directory.name, "weather.sqlite"), "Test",
+                                  pooled=False, cached=False)
+        self.dbops.intialize_db()
+
+    def tearDown(self):
+        """Removes the temporary cache and database."""
+
+        self.scraper.session.close()
+        self.directory.cleanup()
+
+    def test_stream_raises_after_the_downloaded_months(self):
+        """The cached month is yielded, then the stream names the month that failed."""
+
+        batches = []
+
+        with self.assertRaisesRegex(RuntimeError, "1 months failed: 2018-04"):
+            for batch in self.scraper.iter_months(MONTHS, 1):
+                batches.append(batch)
+
+        self.assertEqual([(year, month) for year, month, _ in batches], [(2018, 5)])
+        self.assertEqual(self.scraper.failed_months, [(2018, 4)])
+
+    def test_save_fails_and_keeps_the_failed_month_pending(self):
+        """The downloaded month is saved, the run fails and only the failed month is pending."""
+
+        self.assertIsNone(self.dbops.save_batches(self.scraper.iter_months(MONTHS, 1)))
+        self.assertEqual(self.dbops.pending_months(MONTHS), [(2018, 4)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Checks that parse pool failures fail the station instead of ending its stream early."""
+
+import os
+import tempfile
+import unittest
+from datetime import date
+from db_operations import DBOperations
+from page_cache import PageCache
+from scrape_weather import WeatherScraper, parse_pool
+from tests.test_extract_daily_table import load_fixture
+
+MONTHS = [(2018, 5)]
+
+class ParsePoolTest(unittest.TestCase):
+    """Streams a month served from a page cache, so no request leaves the process."""
+
+    def setUp(self):
+        """Caches the saved May 2018 page as fetched after the month ended."""
+
+        self.directory = tempfile.TemporaryDirectory()
+        cache = PageCache(os.path.join(self.directory.name, "page_cache"))
+        cache.put(WeatherScraper().station_id, 2018, 5, load_fixture("daily_2018_05")[0],
+                  fetched_on=date(2018, 6, 2))
+
+        self.scraper = WeatherScraper(cache=cache)
+        self.dbops = DBOperations(os.path.join(self.directory.name, "weather.sqlite"), "Test",
+                                  pooled=False, cached=False)
+        self.dbops.intialize_db()
+
+    def tearDown(self):
+        """Removes the temporary cache and database."""
+
+        self.scraper.session.close()
+        self.directory.cleanup()
+
+    def test_shared_pool_parses_months(self):
+        """A working shared pool yields the month's records."""
+
+        with parse_pool(1) as pool:
+            batches = list(self.scraper.iter_months_parallel(MONTHS, 1, 1, 1, pool))
+
+        self.assertEqual([(year, month) for year, month, _ in batches], MONTHS)
+        self.assertEqual(len(batches[0][2]), 31)
+
+    def test_shut_down_pool_raises(self):
+        """A pool that can no longer take work fails the stream."""
+
+        pool = parse_pool(1)
+        pool.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            list(self.scraper.iter_months_parallel(MONTHS, 1, 1, 1, pool))
+
+    def test_shut_down_pool_fails_the_save(self):
+        """The save reports the failure and the month stays pending."""
+
+        pool = parse_pool(1)
+        pool.shutdown()
+
+        self.assertIsNone(self.dbops.save_batches(
+            self.scraper.iter_months_parallel(MONTHS, 1, 1, 1, pool)))
+        self.assertEqual(self.dbops.pending_months(MONTHS), MONTHS)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Checks which months the update planner fetches again."""
+
+import calendar
+import os
+import tempfile
+import unittest
+from datetime import date
+from db_operations import DBOperations
+from scrape_weather import extract_daily_table
+from tests.test_extract_daily_table import load_fixture
+
+def month_data(year:int, month:int, blank:tuple = (), flagged:tuple = ()) -> dict:
+    """Returns a scraped {date: values} month, with blank and all-M days at the given days."""
+
+    data = {}
+
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        if day in blank:
+            value = "\xa0"
+
+        elif day in flagged:
+            value = "M"
+
+        else:
+            value = "5.0"
+
+        data[f'{year:04d}-{month:02d}-{day:02d}'] = {"Max": value, "Min": value, "Mean": value}
+
+    return data
+
+class PlanUpdateTest(unittest.TestCase):
+    """Saves months with known fetch dates and plans an update at a fixed date."""
+
+    def setUp(self):
+        """Creates an empty database in a temporary directory."""
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbops = DBOperations(os.path.join(self.directory.name, "weather.sqlite"), "Test",
+                                  pooled=False, cached=False)
+        self.dbops.intialize_db()
+
+    def tearDown(self):
+        """Removes the temporary database."""
+
+        self.directory.cleanup()
+
+    def save(self, year:int, month:int, data:dict, fetched_on:date):
+        """Saves one month as if its page had been fetched on the given day."""
+
+        self.dbops.write_chunk([(year, month, data)])
+        self.dbops.run_write(lambda conn: conn.execute("""UPDATE scrape_log SET fetched_on = ?
+                                                           WHERE year = ? AND month = ?;""",
+                                                        (fetched_on.isoformat(), year, month)))
+
+    def test_missing_and_flagged_months(self):
+        """Missing months and flagged days of pages fetched before month end are gaps."""
+
+        self.save(2025, 1, month_data(2025, 1), date(2025, 2, 3))
+        self.save(2025, 3, month_data(2025, 3, flagged=(9,)), date(2025, 3, 30))
+
+        months = self.dbops.plan_update(date(2025, 1, 1), today=date(2025, 6, 10))
+
+        self.assertIn((2025, 2), months)
+        self.assertIn((2025, 3), months)
+        self.assertNotIn((2025, 1), months)
+
+    def test_final_month_keeps_source_gaps(self):
+        """A page fetched after its month ended is not fetched again for its M days."""
+
+        self.save(2025, 3, month_data(2025, 3, flagged=(9, 10)), date(2025, 4, 2))
+
+        months = self.dbops.plan_update(date(2025, 3, 1), today=date(2025, 6, 10))
+
+        self.assertNotIn((2025, 3), months)
+
+    def test_partial_month_is_fetched_after_it_ends(self):
+        """Blank rows saved from a partial month do not count as stored days."""
+
+        page, _, _ = load_fixture("daily_2026_10")
+        self.save(2026, 10, extract_daily_table(page)[0], date(2026, 10, 18))
+
+        months = self.dbops.plan_update(date(2026, 10, 1), today=date(2027, 1, 5))
+
+        self.assertEqual(months, [(2027, 1), (2026, 12), (2026, 11), (2026, 10)])
+
+    def test_blank_days_of_an_older_month(self):
+        """An older month with blank days and no final page is fetched again."""
+
+        self.save(2025, 2, month_data(2025, 2, blank=(27, 28)), date(2025, 2, 26))
+
+        months = self.dbops.plan_update(date(2025, 2, 1), today=date(2025, 6, 10))
+
+        self.assertIn((2025, 2), months)
+
+    def test_purge_plans_every_month(self):
+        """After a purge the scrape log is gone and every month is fetched again."""
+
+        for month in range(1, 6):
+            self.save(2025, month, month_data(2025, month), date(2025, month + 1, 2))
+
+        self.assertEqual(self.dbops.plan_update(date(2025, 1, 1), today=date(2025, 6, 1)),
+                         [(2025, 6)])
+
+        self.dbops.purge_data()
+        self.dbops.intialize_db()
+
+        self.assertEqual(len(self.dbops.plan_update(date(2025, 1, 1), today=date(2025, 6, 1))),
+                         6)
+
+if __name__ == "__main__":
+    unittest.main()
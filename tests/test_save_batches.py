@@ -0,0 +1,49 @@
+"""Checks that streamed saves keep their resume point unless every month was saved."""
+
+import os
+import tempfile
+import unittest
+from db_operations import DBOperations
+from tests.test_plan_update import month_data
+
+MONTHS = [(2025, 3), (2025, 2), (2025, 1)]
+
+def batches(fail_after:int = None):
+    """Yields the test months, raising after fail_after of them like an aborted download."""
+
+    for count, (year, month) in enumerate(MONTHS):
+        if count == fail_after:
+            raise ConnectionError("stream aborted")
+
+        yield year, month, month_data(year, month)
+
+class SaveBatchesTest(unittest.TestCase):
+    """Saves streams into an empty database and reads back the checkpoints."""
+
+    def setUp(self):
+        """Creates an empty database in a temporary directory."""
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbops = DBOperations(os.path.join(self.directory.name, "weather.sqlite"), "Test",
+                                  pooled=False, cached=False)
+        self.dbops.intialize_db()
+
+    def tearDown(self):
+        """Removes the temporary database."""
+
+        self.directory.cleanup()
+
+    def test_finished_stream_clears_checkpoints(self):
+        """A stream that runs to its end leaves nothing to resume."""
+
+        self.assertEqual(self.dbops.save_batches(batches()), 90)
+        self.assertEqual(self.dbops.pending_months(MONTHS), MONTHS)
+
+    def test_aborted_stream_keeps_checkpoints(self):
+        """An aborted stream fails but commits and checkpoints the months it yielded."""
+
+        self.assertIsNone(self.dbops.save_batches(batches(fail_after=2)))
+        self.assertEqual(self.dbops.pending_months(MONTHS), [(2025, 1)])
+
+if __name__ == "__main__":
+    unittest.main()
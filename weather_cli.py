@@ -0,0 +1,201 @@
+"""Headless command line entry point for ingesting, querying and plotting weather data."""
+
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import sys
+import error_logger
+import instrumentation
+from stations import DEFAULT_STATION, get_station, load_stations
+
+logger = logging.getLogger("main." + __name__)
+
+#Options each plot kind needs, argparse cannot make them depend on the kind.
+PLOT_OPTIONS = {"box": ("start_year", "end_year"), "line": ("year", "month")}
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser for every subcommand."""
+
+    parser = argparse.ArgumentParser(prog="weather_cli",
+                                     description="Weather processor batch mode.")
+    parser.add_argument("--db", default="weather.sqlite", help="SQLite database path.")
+    parser.add_argument("--station", action="append",
+                        help="Station name or id, may be repeated. "
+                             "Defaults to the default station.")
+    parser.add_argument("--stations-file", help="JSON file of extra stations to register.")
+    parser.add_argument("--trace", help="Append a JSONL record of every timed span to this file.")
+    parser.add_argument("--metrics",
+                        help="Write Prometheus text counters and histograms here on exit.")
+    parser.add_argument("--profile",
+                        help="Profile the run with cProfile and tracemalloc into PREFIX.* files. "
+                             "Covers every thread the run starts, not parse worker processes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Download weather data into the database.")
+    ingest.add_argument("--full", action="store_true",
+                        help="Download every month instead of only missing ones.")
+    ingest.add_argument("--workers", type=int, default=8, help="Concurrent downloads per station.")
+    ingest.add_argument("--parallel-stations", type=int, default=4,
+                        help="Stations ingested at once.")
+    ingest.add_argument("--parse-workers", type=int, default=0,
+                        help="Processes parsing pages, shared by every station.")
+    ingest.add_argument("--cache", help="Directory of the raw page cache.")
+
+    query = commands.add_parser("query", help="Stream daily rows between two dates to stdout.")
+    query.add_argument("--start", required=True, help="First date, YYYY-MM-DD.")
+    query.add_argument("--end", required=True, help="Last date, YYYY-MM-DD.")
+    query.add_argument("--format", choices=("csv", "json"), default="csv")
+
+    plot = commands.add_parser("plot", help="Render a plot to an image file.")
+    plot.add_argument("kind", choices=("box", "line"))
+    plot.add_argument("--start-year", type=int, help="First year of a box plot.")
+    plot.add_argument("--end-year", type=int, help="Last year of a box plot.")
+    plot.add_argument("--year", type=int, help="Year of a line plot.")
+    plot.add_argument("--month", type=int, help="Month of a line plot.")
+    plot.add_argument("--output", required=True, help="Image file, the extension picks the format.")
+    plot.add_argument("--render-cache",
+                      help="Directory of rendered images reused until the data changes.")
+
+    snapshot = commands.add_parser("snapshot",
+                                   help="Write or refresh the binary snapshot of every station.")
+    snapshot.add_argument("--output", required=True,
+                          help="Snapshot file, rebuilt only for changed stations.")
+
+    return parser
+
+def check_args(parser:argparse.ArgumentParser, args):
+    """Exits with a usage error when a plot is missing an option its kind needs."""
+
+    if args.command == "plot":
+        missing = ["--" + name.replace("_", "-") for name in PLOT_OPTIONS[args.kind]
+                   if getattr(args, name) is None]
+
+        if missing:
+            parser.error(f"plot {args.kind} requires {' and '.join(missing)}")
+
+def selected_stations(args) -> list:
+    """Resolves the stations named on the command line."""
+
+    if args.stations_file:
+        load_stations(args.stations_file)
+
+    return [get_station(key) for key in args.station] if args.station else [DEFAULT_STATION]
+
+def run_ingest(args) -> int:
+    """Runs a full or incremental ingest for the selected stations."""
+
+    from ingest import ingest_stations
+    from page_cache import PageCache
+
+    cache = PageCache(args.cache) if args.cache else None
+    results = ingest_stations(selected_stations(args), args.db, args.parallel_stations,
+                              args.workers, cache, args.parse_workers, full=args.full)
+
+    for name, saved in (results or {}).items():
+        print(f"{name}\t{saved if saved is not None else 'failed'}")
+
+    return 0 if results and None not in results.values() else 1
+
+def run_query(args) -> int:
+    """Streams the selected rows to stdout as CSV or a JSON array."""
+
+    from db_operations import DBOperations
+
+    stations = selected_stations(args)
+    columns = ("location", "sample_date", "max_temp", "min_temp", "avg_temp", "quality")
+    writer = csv.writer(sys.stdout) if args.format == "csv" else None
+    first = True
+
+    if writer:
+        writer.writerow(columns)
+
+    else:
+        sys.stdout.write("[")
+
+    for station in stations:
+        for row in DBOperations(args.db, station.name).iter_rows(args.start, args.end):
+            if writer:
+                writer.writerow((station.name,) + row)
+
+            else:
+                record = dict(zip(columns, (station.name,) + row))
+                sys.stdout.write(("\n" if first else ",\n") + json.dumps(record))
+                first = False
+
+    if not writer:
+        sys.stdout.write("\n]\n")
+
+    return 0
+
+def run_plot(args) -> int:
+    """Renders a box or line plot straight to a file without a display."""
+
+    from db_operations import DBOperations
+    from plot_operations import PlotRenderer, image_format
+
+    dbops = DBOperations(args.db, selected_stations(args)[0].name)
+    renderer = PlotRenderer(cache_dir=args.render_cache)
+    fmt = image_format(args.output)
+
+    if args.kind == "box":
+        image = renderer.box_plot(dbops, args.start_year, args.end_year, fmt)
+
+    else:
+        image = renderer.line_plot(dbops, args.month, args.year, fmt)
+
+    if image is None:
+        print(f"error: could not render the {args.kind} plot, the log has the details",
+              file=sys.stderr)
+        return 1
+
+    renderer.write(args.output, image)
+    return 0
+
+def run_snapshot(args) -> int:
+    """Exports every station to a memory-mappable snapshot file."""
+
+    from db_operations import DBOperations
+
+    rebuilt = DBOperations(args.db).export_snapshot(args.output)
+
+    if rebuilt is None:
+        return 1
+
+    print(f"rebuilt\t{len(rebuilt)}")
+    return 0
+
+def main(argv:list = None) -> int:
+    """Parses the arguments and runs the chosen subcommand."""
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    commands = {"ingest": run_ingest, "query": run_query, "plot": run_plot,
+                "snapshot": run_snapshot}
+
+    if args.trace or args.metrics:
+        instrumentation.enable(args.trace)
+
+    try:
+        with instrumentation.capture(args.profile) if args.profile else contextlib.nullcontext():
+            if args.command != "ingest":
+                from db_operations import DBOperations
+                DBOperations(args.db).intialize_db()
+
+            return commands[args.command](args)
+
+    except Exception as error:
+        logger.error("cli:%s:%s", args.command, error)
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    finally:
+        if args.metrics:
+            instrumentation.write_prometheus(args.metrics)
+
+        instrumentation.disable()
+
+if __name__ == "__main__":
+    sys.exit(main())
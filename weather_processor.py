@@ -1,16 +1,52 @@
 """Creates and manages the UI for the weather processing app."""
 
 import logging
+import threading
 import wx
 import wx.core
-from dateutil import parser
-from datetime import date, datetime
 from pubsub import pub
+import instrumentation
 from db_operations import DBOperations
-from scrape_weather import WeatherScraper
-from plot_operations import PlotOperations
+from stations import DEFAULT_STATION
 import error_logger
 
+class BackgroundJob(threading.Thread):
+    """Runs a long task on a worker thread and reports back on the UI thread."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, task, on_complete):
+        """Intializes an instance of the BackgroundJob class."""
+
+        try:
+            super().__init__(daemon=True)
+            self.task = task
+            self.on_complete = on_complete
+            self.cancelled = threading.Event()
+
+        except Exception as error:
+            self.logger.error("BackgroundJob:init:%s", error)
+
+    def run(self):
+        """Runs the task with the cancel event and hands the result to the UI thread."""
+
+        result = None
+
+        try:
+            with instrumentation.span("background_job") as timing:
+                result = self.task(self.cancelled)
+                timing.set(cancelled=self.cancelled.is_set())
+
+        except Exception as error:
+            self.logger.error("BackgroundJob:run:%s", error)
+
+        wx.CallAfter(self.on_complete, result)
+
+    def cancel(self):
+        """Asks the task to stop after the month it is working on."""
+
+        self.cancelled.set()
+
 class App(wx.App):
     """Creates the app and intializes the frame."""
 
@@ -78,8 +114,9 @@ class WeatherProcessor(wx.Panel):
             super().__init__(parent=parent)
 
             self.error_flag = False
-            self.flag = False
-            self.load_range = 0
+            self.load_bar = None
+            self.job = None
+            self.full_download = False
 
             DBOperations().intialize_db()
 
@@ -97,7 +134,7 @@ class WeatherProcessor(wx.Panel):
             self.range_error.Hide()
 
             #Creates the buttons.
-            dlbutton = wx.Button(parent=self, label = "Download weather data", pos = (20, 250))
+            self.dlbutton = wx.Button(parent=self, label = "Download weather data", pos = (20, 250))
             self.plotbutton = wx.Button(parent=self, label = "Create Plot", pos = (350, 250))
             self.rad_update = wx.RadioButton(parent=self, label = "Download new weather data", pos = (20, 80))
             self.rad_update.SetValue(True)
@@ -115,17 +152,7 @@ class WeatherProcessor(wx.Panel):
             self.linebutton = wx.BitmapButton(self, -1, bit_line, pos=(300, 75), size=(80,80))
 
             months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
-            self.years = []
-
-            #Figures out the number of years the comboboxes should display.
-            for row in DBOperations().get_db_dates():
-                try:
-                    temp = str(parser.parse(row).year)
-                    if temp not in self.years:
-                        self.years.append(temp)
-
-                except Exception as error:
-                    self.logger.error("WeatherProcessor:init loop 1:%s", error)
+            self.years = DBOperations().get_years()
 
             #Hide these fields on first time run.
             if not self.years:
@@ -157,7 +184,7 @@ class WeatherProcessor(wx.Panel):
             #Subscriptions.
             pub.subscribe(self.load_listener, 'load')
             pub.subscribe(self.complete_listener, 'complete')
-            dlbutton.Bind(event=wx.EVT_BUTTON, handler=self.download_submit)
+            self.dlbutton.Bind(event=wx.EVT_BUTTON, handler=self.download_submit)
             self.plotbutton.Bind(event=wx.EVT_BUTTON, handler=self.plot_submit)
             self.boxbutton.Bind(event=wx.EVT_BUTTON, handler=self.show_boxes)
             self.linebutton.Bind(event=wx.EVT_BUTTON, handler=self.show_boxes)
@@ -167,39 +194,14 @@ class WeatherProcessor(wx.Panel):
         except Exception as error:
             self.logger.error("WeatherProcessor:init:%s", error)
  
-    def update(self):
-        """Updates the database."""
-
-        try:
-            today = datetime.now().date()
-            dates = DBOperations().get_db_dates()
-            startdate = parser.parse(dates[-1]).date()
-
-            if today not in dates:
-                data = WeatherScraper().update_scrape(startdate)
-
-            DBOperations().save_data(data)
-
-        except Exception as error:
-            self.logger.error("weather_processor:update:%s", error)
-
     def refresh(self):
         """Reloads the combo boxes."""
 
         try:
-            self.flag = False
             self.startyearbox.Clear()
             self.endyearbox.Clear()
 
-            for row in DBOperations().get_db_dates():
-                try:
-                    temp = str(parser.parse(row).year)
-                    if temp not in self.years:
-                        self.years.append(temp)
-
-                except Exception as error:
-                    self.logger.error("WeatherProcessor:load loop 1:%s", error)
-
+            self.years = DBOperations().get_years()
             self.startyearbox.AppendItems(self.years)
             self.endyearbox.AppendItems(self.years)
             self.endyearbox.SetSelection(0)
@@ -212,27 +214,53 @@ class WeatherProcessor(wx.Panel):
         """Handles the click event for the download button."""
 
         try:
-            today = date.today()
-            total_months = (today.year - 1995) * 12 - 9 - (12 - today.month)
-
-            if self.years:
-                dblast_month = parser.parse(DBOperations().get_db_dates()[-1])
-                update_year = today.year - int(self.years[-1])
-                update_months = today.month - dblast_month.month
-                update_bar_range = update_year * 12 + update_months + 1
-
-            if self.rad_update.GetValue():
-                self.loading_bar()
-                load_bar.SetRange(update_bar_range)
-                self.update()
-                self.refresh()
-
-            if self.rad_new.GetValue():
-                scraper = WeatherScraper()
-                self.loading_bar()
-                load_bar.SetRange(total_months)
-                DBOperations().save_data(scraper.get_data())
-                self.refresh()
+            if self.job is not None and self.job.is_alive():
+                return
+
+            #The scraper and its HTTP stack load on the first download, not at startup.
+            from page_cache import PageCache
+            from scrape_weather import WeatherScraper
+
+            #Closed months come from the page cache, a repeat download revalidates only recent ones.
+            scraper = WeatherScraper(cache=PageCache())
+            dbops = DBOperations()
+            self.full_download = self.rad_new.GetValue()
+
+            if self.full_download:
+                months = dbops.pending_months(scraper.month_list())
+
+            else:
+                months = dbops.plan_update(DEFAULT_STATION.first_month)
+
+            #The scrape and save run on a worker thread so the event loop keeps running.
+            task = lambda cancel: dbops.save_batches(scraper.iter_months(months), cancel=cancel)
+
+            self.loading_bar(max(len(months), 1))
+            self.dlbutton.Disable()
+            self.job = BackgroundJob(task, self.download_complete)
+            self.job.start()
+
+        except Exception as error:
+            self.logger.error("WeatherProcessor:download_submit:%s", error)
+
+    def download_complete(self, saved):
+        """Closes the progress dialog and reloads the controls once a download job ends."""
+
+        try:
+            if self.load_bar is not None:
+                self.load_bar.Destroy()
+                self.load_bar = None
+
+            self.dlbutton.Enable()
+            self.refresh()
+
+            #A failed run keeps its checkpoints, so the next download only retries the rest.
+            if saved is None:
+                wx.MessageBox("Some months could not be downloaded, error.log has the details. "
+                              "Download again to retry them.", "Download incomplete",
+                              wx.OK | wx.ICON_WARNING)
+
+            if self.full_download and self.years:
                 self.rad_update.Show()
                 self.graphtext.Show()
                 self.linebutton.Show()
@@ -240,35 +268,51 @@ class WeatherProcessor(wx.Panel):
                 self.plotbutton.Show()
 
         except Exception as error:
-            self.logger.error("WeatherProcessor:download_submit:%s", error)
-
-    def loading_bar(self):
-        """Creates a global progress dialog control."""
-        
-        global load_bar
-        load_bar = wx.ProgressDialog("Downloading Weather Data", "Retrieving Data", maximum=100, parent=self, 
-                        style=wx.PD_APP_MODAL|wx.PD_ESTIMATED_TIME|wx.PD_ELAPSED_TIME)
-    
-    def load_listener(self, counter):
-        """Listener that updates the loadbar"""
+            self.logger.error("WeatherProcessor:download_complete:%s", error)
 
-        load_bar.Update(counter)
-        start_date = date(1996, 10, 1)
-        today = date.today()
+    def loading_bar(self, maximum:int):
+        """Creates the cancellable progress dialog for a download."""
 
-        if counter == load_bar.GetRange()-1 and self.flag is False:
+        self.load_bar = wx.ProgressDialog("Downloading Weather Data", "Retrieving Data",
+                                          maximum=maximum, parent=self,
+                                          style=wx.PD_APP_MODAL|wx.PD_CAN_ABORT
+                                          |wx.PD_ESTIMATED_TIME|wx.PD_ELAPSED_TIME)
 
-            self.flag = True
-            self.load_range
+    def load_listener(self, counter, progress=None):
+        """Listener that forwards the already rate-limited progress to the UI thread."""
 
-            self.load_range = today - start_date
-            load_bar.Update(0, "Inserting Data.")
-            load_bar.SetRange(self.load_range.days)
+        wx.CallAfter(self.show_progress, counter, progress)
 
     def complete_listener(self):
-        """Listener that fills the loadbar to prevent the loadbar from possibly getting stuck."""
+        """Listener that fills the loadbar once every batch is saved."""
 
-        load_bar.Update(self.load_range.days)
+        wx.CallAfter(self.show_progress, None)
+
+    def show_progress(self, counter, progress:dict = None):
+        """Updates the loadbar on the UI thread and cancels the job if the user aborted."""
+
+        try:
+            if self.load_bar is None:
+                return
+
+            maximum = self.load_bar.GetRange()
+            value = maximum - 1 if counter is None else min(counter, maximum - 1)
+            message = "Retrieving Data"
+
+            if progress is not None:
+                message = (f"{progress['phase'].capitalize()}: "
+                           f"{progress['done']} of {progress['total'] or '?'} "
+                           f"({progress['rows_per_second']:.0f} rows/s, "
+                           f"{progress['bytes_per_second'] / 1024:.0f} KiB/s)")
+
+            keep_going = self.load_bar.Update(value, message)[0]
+
+            if not keep_going and self.job is not None:
+                self.load_bar.Update(value, "Cancelling, saving the finished months.")
+                self.job.cancel()
+
+        except Exception as error:
+            self.logger.error("WeatherProcessor:show_progress:%s", error)
 
     def plot_submit(self, event):
         """Handles the click event for the plot button."""
@@ -277,20 +321,22 @@ class WeatherProcessor(wx.Panel):
             self.validate()
             
             if self.error_flag is False:
+                #matplotlib loads on the first plot, not at startup.
+                from plot_operations import PlotOperations
 
                 self.range_error.Hide()
 
                 if self.monthcombo.IsShown() is True:
                     month = self.monthcombo.GetValue()
                     year = self.startyearbox.GetValue()
-                    data = DBOperations().fetch_data_month(month, year)
-                    PlotOperations().create_line_plot(month, year, data)
+                    series = DBOperations().fetch_series(f'{year}-{month}-01', f'{year}-{month}-31')
+                    PlotOperations().create_plot_from_series('line', month, year, series)
 
                 if self.endyearbox.IsShown() is True:
                     start = self.startyearbox.GetValue()
                     end = self.endyearbox.GetValue()
-                    data = DBOperations().fetch_data_year(start, end)
-                    PlotOperations().create_box_plot(start, end, data)
+                    stats = DBOperations().fetch_box_stats(start, end)
+                    PlotOperations().create_box_plot_from_stats(start, end, stats)
 
         except Exception as error:
             self.logger.error("WeatherProcessor:plot_submit:%s", error)
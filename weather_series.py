@@ -0,0 +1,236 @@
+"""This Module holds a station's daily temperatures as columnar NumPy arrays for analytics."""
+
+import logging
+from datetime import date
+import numpy
+
+#date.toordinal of 1970-01-01, the epoch of numpy.datetime64.
+EPOCH_ORDINAL = 719163
+
+COLUMNS = ('max', 'min', 'mean')
+
+class WeatherSeries():
+    """Date ordinals and float32 max, min and mean temperatures, NaN where a value is missing."""
+
+    logger = logging.getLogger("main." + __name__)
+
+    def __init__(self, ordinals, max_temp, min_temp, mean_temp, location:str = None):
+        """Intializes an instance of the WeatherSeries class."""
+
+        self.location = location
+        self.ordinals = numpy.ascontiguousarray(ordinals, dtype=numpy.int32)
+
+        #One contiguous block, each column is a row view into it.
+        self.values = numpy.array([max_temp, min_temp, mean_temp],
+                                  dtype=numpy.float32).reshape(3, -1)
+
+    @classmethod
+    def from_rows(cls, rows:list, location:str = None) -> 'WeatherSeries':
+        """Builds a series from date-ordered (ordinal, max, min, mean) rows, None for missing."""
+
+        table = numpy.array(rows, dtype=numpy.float64).reshape(-1, 4)
+        return cls(table[:, 0], table[:, 1], table[:, 2], table[:, 3], location)
+
+    @classmethod
+    def from_arrays(cls, ordinals:numpy.ndarray, values:numpy.ndarray,
+                    location:str = None) -> 'WeatherSeries':
+        """Wraps existing int32 ordinals and a (3, n) float32 block without copying them."""
+
+        series = cls.__new__(cls)
+        series.location = location
+        series.ordinals = ordinals
+        series.values = values
+        return series
+
+    @property
+    def missing(self) -> numpy.ndarray:
+        """Mask of the missing values, one row per column."""
+
+        return numpy.isnan(self.values)
+
+    def __len__(self) -> int:
+        """Returns the number of days in the series."""
+
+        return len(self.ordinals)
+
+    def column(self, name:str) -> numpy.ndarray:
+        """Returns the max, min or mean temperature column."""
+
+        return self.values[COLUMNS.index(name)]
+
+    @property
+    def max_temp(self) -> numpy.ndarray:
+        """Daily maximum temperatures."""
+
+        return self.values[0]
+
+    @property
+    def min_temp(self) -> numpy.ndarray:
+        """Daily minimum temperatures."""
+
+        return self.values[1]
+
+    @property
+    def mean_temp(self) -> numpy.ndarray:
+        """Daily mean temperatures."""
+
+        return self.values[2]
+
+    def dates(self, unit:str = 'D') -> numpy.ndarray:
+        """Returns the sample dates as datetime64 values truncated to the given unit."""
+
+        return (self.ordinals - EPOCH_ORDINAL).astype('datetime64[D]').astype(f'datetime64[{unit}]')
+
+    def months(self) -> numpy.ndarray:
+        """Returns the calendar month, 1 to 12, of every day."""
+
+        return self.dates('M').astype(int) % 12 + 1
+
+    def years(self) -> numpy.ndarray:
+        """Returns the year of every day."""
+
+        return self.dates('Y').astype(int) + 1970
+
+    def between(self, start_date:str, end_date:str) -> 'WeatherSeries':
+        """Returns the days between two ISO dates inclusive, found by binary search."""
+
+        try:
+            start = date.fromisoformat(start_date).toordinal()
+            end = date.fromisoformat(end_date).toordinal()
+            low = numpy.searchsorted(self.ordinals, start, side='left')
+            high = numpy.searchsorted(self.ordinals, end, side='right')
+
+            return WeatherSeries.from_arrays(self.ordinals[low:high], self.values[:, low:high],
+                                             self.location)
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:between:%s", error)
+
+    def resample(self, unit:str = 'M', column:str = 'mean', how:str = 'mean') -> tuple:
+        """Aggregates a column per month ('M') or year ('Y'), returns (periods, values, counts)."""
+
+        try:
+            values = self.column(column)
+            periods, starts, counts = numpy.unique(self.dates(unit), return_index=True,
+                                                   return_counts=True)
+            valid = numpy.add.reduceat(~numpy.isnan(values), starts) if len(values) else counts
+
+            #Days are sorted, so every period is one contiguous run starting at starts.
+            if how == 'mean':
+                sums = (numpy.add.reduceat(numpy.nan_to_num(values), starts)
+                        if len(values) else values)
+                result = numpy.divide(sums, valid,
+                                      out=numpy.full(len(periods), numpy.nan, numpy.float32),
+                                      where=valid > 0)
+
+            elif how in ('min', 'max'):
+                reduce = numpy.fmin if how == 'min' else numpy.fmax
+                result = reduce.reduceat(values, starts) if len(values) else values
+
+            elif how == 'count':
+                result = valid
+
+            else:
+                raise ValueError(f"Unknown aggregation: {how}")
+
+            return periods, result, valid
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:resample:%s", error)
+
+    def rolling_mean(self, window:int, column:str = 'mean', min_periods:int = 1) -> numpy.ndarray:
+        """Returns the mean over the trailing window of calendar days ending on every day."""
+
+        try:
+            values = self.column(column)
+            offsets = self.ordinals - self.ordinals[0] if len(values) else self.ordinals
+            valid = ~numpy.isnan(values)
+
+            #Cumulative sums over a dense calendar make gaps count as missing days.
+            dense_sums = numpy.zeros(int(offsets[-1]) + 2 if len(values) else 1)
+            dense_counts = numpy.zeros_like(dense_sums)
+            dense_sums[offsets + 1] = numpy.where(valid, values, 0)
+            dense_counts[offsets + 1] = valid
+            numpy.cumsum(dense_sums, out=dense_sums)
+            numpy.cumsum(dense_counts, out=dense_counts)
+
+            ends = offsets + 1
+            starts = numpy.maximum(ends - window, 0)
+            counts = dense_counts[ends] - dense_counts[starts]
+            sums = dense_sums[ends] - dense_sums[starts]
+
+            return numpy.divide(sums, counts, out=numpy.full(len(values), numpy.nan),
+                                where=counts >= min_periods).astype(numpy.float32)
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:rolling_mean:%s", error)
+
+    def climatology(self, column:str = 'mean') -> numpy.ndarray:
+        """Returns the mean of a column for each calendar month, indexed 0 for January."""
+
+        try:
+            values = self.column(column)
+            valid = ~numpy.isnan(values)
+            months = self.months()[valid] - 1
+            sums = numpy.bincount(months, weights=values[valid], minlength=12)
+            counts = numpy.bincount(months, minlength=12)
+
+            return numpy.divide(sums, counts, out=numpy.full(12, numpy.nan),
+                                where=counts > 0).astype(numpy.float32)
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:climatology:%s", error)
+
+    def anomalies(self, column:str = 'mean', baseline:'WeatherSeries' = None) -> numpy.ndarray:
+        """Returns each day's departure from the calendar month climatology of a baseline."""
+
+        try:
+            normals = (baseline if baseline is not None else self).climatology(column)
+            return self.column(column) - normals[self.months() - 1]
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:anomalies:%s", error)
+
+    def percentiles(self, q, column:str = 'mean', by_month:bool = False) -> numpy.ndarray:
+        """Returns nearest-rank percentiles of a column, overall or as a row per calendar month."""
+
+        try:
+            values = self.column(column)
+
+            if not by_month:
+                return numpy.nanpercentile(values, q, method='inverted_cdf')
+
+            months = self.months()
+            return numpy.array([
+                numpy.nanpercentile(values[months == month], q, method='inverted_cdf')
+                if numpy.any(~numpy.isnan(values[months == month]))
+                else numpy.full(numpy.shape(q), numpy.nan)
+                for month in range(1, 13)])
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:percentiles:%s", error)
+
+    def box_stats(self, column:str = 'mean') -> dict:
+        """Computes exact per-month box plot statistics in matplotlib's Axes.bxp format."""
+
+        try:
+            values = self.column(column)
+            months = self.months()
+            quartiles = self.percentiles([0, 25, 50, 75, 100], column, by_month=True)
+            stats = {}
+
+            for month in range(1, 13):
+                selected = values[(months == month) & ~numpy.isnan(values)]
+
+                if not len(selected):
+                    continue
+
+                low, q1, median, q3, high = quartiles[month - 1].tolist()
+                stats[month] = {'label': str(month), 'count': len(selected),
+                                'mean': float(selected.mean()), 'std': float(selected.std()),
+                                'whislo': low, 'q1': q1, 'med': median, 'q3': q3, 'whishi': high}
+
+            return stats
+
+        except Exception as error:
+            self.logger.error("WeatherSeries:box_stats:%s", error)